@@ -0,0 +1,175 @@
+"""
+Офлайн-бенчмарк цепочки вопрос -> SQL -> ответ без Telegram и без настоящей LLM.
+
+Вопросы из корпуса (app/benchmark_questions.json) проходят через NLPHandler
+(шаблоны, роутер LLM) и Database.execute_query на локальном PostgreSQL из
+DATABASE_URL. Вместо LLM отвечает заглушка: готовый SQL из корпуса с
+задержкой --llm-delay. Для каждого числа одновременных чатов печатаются
+p50/p95/p99 по этапам, пропускная способность и загрузка пула подключений.
+
+    python app/benchmark.py --chats 1,8,32 --rounds 3 --llm-delay 0.8
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bot.cache import QuestionCache, normalize_question  # noqa: E402
+from bot.database import db  # noqa: E402
+from bot.llm_router import LLMBackend  # noqa: E402
+from bot.nlp_handler import NLPHandler  # noqa: E402
+from bot.scheduler import QueryScheduler  # noqa: E402
+
+CORPUS_PATH = Path(__file__).parent / "benchmark_questions.json"
+
+STAGES = ("queue", "build", "llm", "sql", "total")
+
+
+class StubBackend(LLMBackend):
+    """Заглушка LLM: возвращает SQL из корпуса для последнего вопроса промпта."""
+
+    def __init__(self, corpus: list, delay: float, jitter: float, stats: "BenchmarkStats"):
+        super().__init__("stub", "canned-sql", None, "")
+        self.answers = {normalize_question(item["question"]): item["sql"] for item in corpus}
+        self.delay = delay
+        self.jitter = jitter
+        self.stats = stats
+
+    async def request(self, user_prompt: str, timeout: float) -> str:
+        started = time.perf_counter()
+        question = user_prompt.rsplit("Вопрос:", 1)[-1].rsplit("SQL:", 1)[0]
+        await asyncio.sleep(self.delay * random.uniform(1 - self.jitter, 1 + self.jitter))
+        self.stats.add("llm", time.perf_counter() - started)
+        return self.answers.get(normalize_question(question), "SELECT 0")
+
+
+class BenchmarkStats:
+    """Замеры одного прогона: длительности этапов, ошибки и загрузка пула."""
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self.errors = 0
+        self.pool_busy = []
+        self.pool_max = 0
+
+    def add(self, stage: str, seconds: float):
+        self.samples[stage].append(seconds)
+
+    @staticmethod
+    def percentile(values: list, q: float) -> float:
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def report(self, chats: int, elapsed: float):
+        answered = len(self.samples["total"])
+        print(f"\n=== {chats} одновременных чатов ===")
+        print(f"Вопросов: {answered}, ошибок: {self.errors}, время: {elapsed:.2f} с, "
+              f"пропускная способность: {answered / elapsed:.1f} вопросов/с")
+        print(f"{'этап':<8}{'n':>7}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+        for stage in STAGES:
+            values = self.samples[stage]
+            if not values:
+                continue
+            row = [self.percentile(values, q) * 1000 for q in (0.5, 0.95, 0.99)] + [max(values) * 1000]
+            print(f"{stage:<8}{len(values):>7}" + "".join(f"{value:>10.1f}" for value in row))
+        if self.pool_busy:
+            saturated = sum(1 for busy in self.pool_busy if busy >= self.pool_max)
+            print(f"Пулы чтения БД: максимум {self.pool_max}, занято в пике {max(self.pool_busy)}, "
+                  f"в среднем {sum(self.pool_busy) / len(self.pool_busy):.1f}, "
+                  f"полностью занят {saturated / len(self.pool_busy):.0%} времени")
+
+
+async def sample_pool(stats: BenchmarkStats, interval: float = 0.005):
+    """Периодически записывает число занятых подключений в пулах чтения."""
+    pools = [pool for _, role, pool in db.pools.pools() if role == "read"]
+    stats.pool_max = sum(pool.get_max_size() for pool in pools)
+    while True:
+        stats.pool_busy.append(sum(pool.get_size() - pool.get_idle_size() for pool in pools))
+        await asyncio.sleep(interval)
+
+
+async def ask(handler: NLPHandler, scheduler: QueryScheduler, stats: BenchmarkStats, chat_id: int, question: str):
+    """Проводит вопрос через планировщик, NLPHandler и БД, как это делает бот."""
+    submitted = time.perf_counter()
+
+    async def pipeline():
+        started = time.perf_counter()
+        stats.add("queue", started - submitted)
+        sql_query, params = await handler.build_query(question, use_rollups=db.rollups_ready)
+        built = time.perf_counter()
+        stats.add("build", built - started)
+        result = await db.execute_query(sql_query, *params)
+        stats.add("sql", time.perf_counter() - built)
+        return result
+
+    try:
+        await scheduler.submit(chat_id, normalize_question(question), pipeline)
+    except Exception as e:
+        stats.errors += 1
+        print(f"Ошибка на вопросе «{question}»: {e}")
+        return
+    stats.add("total", time.perf_counter() - submitted)
+
+
+async def run_level(corpus: list, chats: int, args) -> None:
+    """Прогон: каждый чат задает вопросы корпуса по очереди, чаты работают одновременно."""
+    stats = BenchmarkStats()
+    cache = QuestionCache(db) if args.sql_cache else None
+    backend = StubBackend(corpus, args.llm_delay, args.llm_jitter, stats)
+    handler = NLPHandler(cache=cache, backends=[backend])
+    # Без кэша результатов каждый вопрос доходит до PostgreSQL
+    if not args.result_cache:
+        db.data_version = None
+    db.result_cache.clear()
+    scheduler = QueryScheduler(max_queued=chats * len(corpus) * args.rounds)
+
+    async def chat(chat_id: int):
+        rng = random.Random(chat_id)
+        for _ in range(args.rounds):
+            questions = [item["question"] for item in corpus]
+            rng.shuffle(questions)
+            for question in questions:
+                await ask(handler, scheduler, stats, chat_id, question)
+
+    sampler = asyncio.create_task(sample_pool(stats))
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(chat(chat_id) for chat_id in range(chats)))
+    finally:
+        sampler.cancel()
+    stats.report(chats, time.perf_counter() - started)
+
+
+async def main(args):
+    corpus = json.loads(Path(args.corpus).read_text(encoding="utf-8"))
+
+    await db.connect()
+    try:
+        if args.data and (args.reload or not await db.check_data_exists()):
+            from setup_db import load_json_to_db
+            await load_json_to_db(args.data, mode="full")
+            await db.check_rollups_ready()
+
+        for chats in (int(value) for value in args.chats.split(",")):
+            await run_level(corpus, chats, args)
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=str(CORPUS_PATH), help="JSON со списком {question, sql}")
+    parser.add_argument("--data", help="JSON с видео для загрузки, если база пуста")
+    parser.add_argument("--reload", action="store_true", help="перезагрузить --data, даже если данные есть")
+    parser.add_argument("--chats", default="1,8,32", help="числа одновременных чатов через запятую")
+    parser.add_argument("--rounds", type=int, default=3, help="сколько раз каждый чат задает корпус")
+    parser.add_argument("--llm-delay", type=float, default=0.8, help="средняя задержка заглушки LLM, с")
+    parser.add_argument("--llm-jitter", type=float, default=0.3, help="разброс задержки заглушки (доля)")
+    parser.add_argument("--sql-cache", action="store_true", help="включить кэш вопрос -> SQL")
+    parser.add_argument("--result-cache", action="store_true", help="включить кэш результатов запросов")
+    asyncio.run(main(parser.parse_args()))
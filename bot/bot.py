@@ -1,20 +1,47 @@
+import asyncio
+import hashlib
 import logging
 import os
+import time
+from typing import Optional
 
 from aiogram import Bot, Dispatcher, F
 from aiogram.filters import Command
 from aiogram.types import Message
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
 from dotenv import load_dotenv
 
-from bot.database import db
-from bot.nlp_handler import NLPHandler
+from bot.cache import QuestionCache, normalize_question
+from bot.database import QueryTooExpensive, db
+from bot.metrics import QUESTIONS, STARTUP_SECONDS, Trace, bind_scheduler, current_trace, observe, stage
+from bot.nlp_handler import close_nlp_handler, get_nlp_handler
+from bot.scheduler import QueryScheduler, SchedulerBusy, SingleFlight
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Публичный адрес сервиса (https://example.onrender.com); если задан, бот получает
+# обновления через webhook на aiohttp-приложении из main.py вместо polling
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+
+# Секрет, который Telegram присылает в X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
+# Сколько одновременных HTTPS-запросов с обновлениями Telegram может держать к сервису
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
+
 bot = Bot(token=os.getenv("TELEGRAM_BOT_TOKEN"))
 dp = Dispatcher()
+question_cache = QuestionCache(db)
+scheduler = QueryScheduler()
+bind_scheduler(scheduler)
+single_flight = SingleFlight()
+
+# Устанавливается, когда prepare() закончил: вопросы, пришедшие по webhook раньше, ждут
+bot_ready = asyncio.Event()
 
 
 @dp.message(Command("start"))
@@ -29,6 +56,28 @@ async def cmd_start(message: Message):
     )
 
 
+async def answer_question(user_query: str) -> float:
+    """Преобразует вопрос в SQL и выполняет его."""
+    nlp_handler = get_nlp_handler(cache=question_cache)
+
+    sql_query, params = await nlp_handler.build_query(user_query, use_rollups=db.rollups_ready)
+    logger.info(f"SQL запрос: {sql_query} {params if params else ''}")
+
+    try:
+        try:
+            return await db.execute_query(sql_query, *params)
+        except QueryTooExpensive as e:
+            # Стоимость проверяется только у SQL от LLM: просим переписать его один раз
+            logger.warning(f"{e}, запрашиваю у LLM более дешевый запрос")
+            sql_query = await nlp_handler.cheaper_sql(user_query, sql_query, str(e))
+            logger.info(f"SQL запрос (переписан): {sql_query}")
+            return await db.execute_query(sql_query)
+    except ValueError:
+        # Не отдаем ошибочный SQL из кэша при повторе вопроса
+        await question_cache.invalidate(user_query)
+        raise
+
+
 @dp.message(F.text)
 async def handle_text_message(message: Message):
     user_query = message.text.strip()
@@ -37,43 +86,155 @@ async def handle_text_message(message: Message):
         await message.answer("Пожалуйста, задайте вопрос на русском языке.")
         return
 
+    started = time.perf_counter()
+    trace = Trace(f"Вопрос из чата {message.chat.id}")
+    current_trace.set(trace)
+    # Telegram указывает время отправки с точностью до секунды
+    observe("receive", max(time.time() - message.date.timestamp(), 0.0))
+
     try:
         await message.answer("Обрабатываю запрос...")
-
-        nlp_handler = NLPHandler()
-
-        sql_query = await nlp_handler.text_to_sql(user_query)
-        logger.info(f"SQL запрос: {sql_query}")
-
-        result = await db.execute_query(sql_query)
-
-        await message.answer(str(int(result)))
-
+        await bot_ready.wait()
+
+        # Один и тот же вопрос из разных чатов считается один раз:
+        # остальные чаты ждут ответа первого и не занимают места в очереди
+        key = normalize_question(user_query)
+        result = await single_flight.do(
+            key,
+            lambda: scheduler.submit(message.chat.id, key, lambda: answer_question(user_query)),
+        )
+
+        with stage("reply"):
+            await message.answer(str(int(result)))
+        QUESTIONS.labels("answered").inc()
+
+    except SchedulerBusy:
+        QUESTIONS.labels("busy").inc()
+        logger.warning(f"Очередь переполнена, вопрос из чата {message.chat.id} отклонен")
+        await message.answer("Сейчас слишком много запросов. Пожалуйста, повторите вопрос через минуту.")
     except ValueError as e:
+        QUESTIONS.labels("error").inc()
         logger.error(f"Ошибка обработки запроса: {e}")
         await message.answer(f"Ошибка: {str(e)}")
     except Exception as e:
+        QUESTIONS.labels("error").inc()
         logger.error(f"Неожиданная ошибка: {e}", exc_info=True)
         await message.answer("Произошла ошибка при обработке запроса. Попробуйте переформулировать вопрос.")
+    finally:
+        observe("total", time.perf_counter() - started)
+        logger.info(trace.summary())
 
 
-async def main():
-    """Главная функция для запуска бота."""
+async def prepare():
+    """
+    Подключается к БД и загружает данные, если таблицы пустые.
+
+    Длительности этапов запуска пишутся в лог и в метрику bot_startup_seconds.
+    """
+    started = time.perf_counter()
     await db.connect()
-    logger.info("Подключение к базе данных установлено")
+    connected = time.perf_counter()
+    STARTUP_SECONDS.labels("connect").set(connected - started)
+    logger.info(f"Подключение к базе данных установлено за {(connected - started) * 1000:.0f} мс")
 
     # Проверяем и загружаем данные, если таблицы пустые
     try:
-        data_exists = await db.check_data_exists()
-        if not data_exists:
-            logger.info("Таблицы пустые, начинаю загрузку данных...")
-            from setup_db import load_json_to_db
-            await load_json_to_db()
+        if await db.load_initial_data():
             logger.info("Данные успешно загружены")
         else:
             logger.info("Данные уже есть в базе данных")
     except Exception as e:
         logger.warning(f"Не удалось проверить/загрузить данные: {e}. Продолжаю запуск бота.")
+    checked = time.perf_counter()
+    STARTUP_SECONDS.labels("data").set(checked - connected)
+
+    # Клиенты LLM создаются заранее, а не на первом вопросе
+    try:
+        get_nlp_handler(cache=question_cache)
+    except ValueError as e:
+        logger.warning(f"Модели LLM не настроены: {e}")
+    ready = time.perf_counter()
+    STARTUP_SECONDS.labels("llm").set(ready - checked)
+    STARTUP_SECONDS.labels("total").set(ready - started)
+    logger.info(f"Бот готов к работе за {(ready - started) * 1000:.0f} мс")
+    bot_ready.set()
+
+
+async def shutdown():
+    """Закрывает клиентов LLM и подключение к БД."""
+    await close_nlp_handler()
+    await db.disconnect()
+    logger.info("Подключение к базе данных закрыто")
+
+
+def webhook_secret() -> str:
+    """
+    Секрет webhook: WEBHOOK_SECRET или производный от токена бота.
+
+    Производный секрет одинаков во всех процессах за балансировщиком,
+    поэтому каждый из них может зарегистрировать webhook заново.
+    """
+    if WEBHOOK_SECRET:
+        return WEBHOOK_SECRET
+    return hashlib.sha256(f"webhook:{bot.token}".encode()).hexdigest()
+
+
+def setup_webhook(app: web.Application):
+    """
+    Регистрирует прием обновлений Telegram на маршруте WEBHOOK_PATH приложения.
+
+    Запросы без правильного секрета отклоняются с 401. Каждое обновление
+    обрабатывается в отдельной задаче, а Telegram сразу получает ответ 200,
+    поэтому медленный вопрос не задерживает доставку следующих.
+
+    Подключение к БД и загрузка данных идут в фоне: aiohttp не открывает
+    порт, пока не завершится on_startup, а /health и webhook должны отвечать
+    сразу. Вопросы, пришедшие раньше, ждут окончания prepare().
+    """
+    preparing: Optional[asyncio.Task] = None
+
+    async def prepare_in_background():
+        try:
+            await prepare()
+        except Exception as e:
+            logger.error(f"Не удалось подготовить бота: {e}", exc_info=True)
+        finally:
+            # Вопросы не должны ждать вечно: без БД они получат сообщение об ошибке
+            bot_ready.set()
+
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=webhook_secret(),
+        handle_in_background=True,
+    ).register(app, path=WEBHOOK_PATH)
+
+    async def on_startup(app: web.Application):
+        nonlocal preparing
+        preparing = asyncio.create_task(prepare_in_background())
+        url = WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH
+        await bot.set_webhook(
+            url,
+            secret_token=webhook_secret(),
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info(f"Webhook установлен: {url}")
+
+    async def on_cleanup(app: web.Application):
+        if preparing is not None and not preparing.done():
+            preparing.cancel()
+            await asyncio.gather(preparing, return_exceptions=True)
+        await bot.session.close()
+        await shutdown()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+
+
+async def main():
+    """Главная функция для запуска бота в режиме polling."""
+    await prepare()
 
     try:
         # Очищаем webhook, если он был установлен (для избежания конфликтов)
@@ -82,13 +243,8 @@ async def main():
         
         await dp.start_polling(bot)
     finally:
-        await db.disconnect()
-        logger.info("Подключение к базе данных закрыто")
+        await shutdown()
 
 
 if __name__ == "__main__":
-    import asyncio
-
     asyncio.run(main())
-
-#
\ No newline at end of file
@@ -0,0 +1,223 @@
+"""Модуль кэширования: LRU-кэш в памяти и кэш вопрос -> SQL с хранением в PostgreSQL."""
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+_WORD_RE = re.compile(r"[\w\-]+")
+_ID_CHARS_RE = re.compile(r"[A-Za-z0-9]")
+
+
+def normalize_question(text: str) -> str:
+    """
+    Приводит вопрос к каноническому виду для использования в качестве ключа кэша.
+
+    Регистр русских слов, буква "ё", знаки препинания и лишние пробелы не
+    влияют на ключ. Слова с латиницей или цифрами - это идентификаторы
+    (creator_id "AbC" и "abc" - разные креаторы), их регистр сохраняется;
+    дефисы и подчеркивания тоже сохраняются.
+    """
+    text = text.replace("ё", "е").replace("Ё", "Е")
+    text = re.sub(r"[^\w\s\-]", " ", text)
+    text = _WORD_RE.sub(lambda m: m.group(0) if _ID_CHARS_RE.search(m.group(0)) else m.group(0).lower(), text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class LRUCache:
+    """LRU-кэш в памяти с ограничением размера, временем жизни и счетчиками."""
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key, default=None) -> Any:
+        """Возвращает значение по ключу или default, если его нет или оно устарело."""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+
+        value, expires_at = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Сохраняет значение, вытесняя самые давно использованные записи."""
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None) -> Any:
+        """Удаляет значение из кэша."""
+        item = self._data.pop(key, None)
+        return item[0] if item else default
+
+    def clear(self):
+        """Очищает кэш (счетчики сохраняются)."""
+        self._data.clear()
+
+    def stats(self) -> dict:
+        """Возвращает размер кэша и счетчики попаданий."""
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class QuestionCache:
+    """
+    Кэш преобразования вопрос -> SQL.
+
+    Первый уровень - LRUCache в памяти процесса, второй - таблица sql_cache
+    в PostgreSQL, которая переживает перезапуски и общая для всех экземпляров
+    бота. Записи старше ttl считаются устаревшими, а таблица периодически
+    обрезается до max_rows последних использованных записей.
+    """
+
+    # Раз во сколько записей выполнять очистку таблицы
+    CLEANUP_EVERY = 100
+
+    def __init__(self, database, maxsize: int = None, ttl: float = None, max_rows: int = None):
+        self.database = database
+        self.ttl = ttl or float(os.getenv("SQL_CACHE_TTL", 7 * 24 * 3600))
+        self.max_rows = max_rows or int(os.getenv("SQL_CACHE_MAX_ROWS", 10000))
+        self.memory = LRUCache(maxsize or int(os.getenv("SQL_CACHE_SIZE", 1000)), self.ttl)
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+
+    @staticmethod
+    def make_key(question: str) -> str:
+        """Вычисляет ключ кэша по нормализованному вопросу."""
+        return hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+
+    async def get(self, question: str) -> Optional[str]:
+        """Возвращает закэшированный SQL для вопроса или None."""
+        key = self.make_key(question)
+
+        sql_query = self.memory.get(key)
+        if sql_query is not None:
+            self.hits += 1
+            return sql_query
+
+        if self.database.pool is not None:
+            try:
+                async with self.database.pool.acquire() as conn:
+                    sql_query = await conn.fetchval(
+                        """
+                        UPDATE sql_cache
+                        SET hits = hits + 1, last_used_at = NOW()
+                        WHERE question_hash = $1
+                          AND created_at > NOW() - make_interval(secs => $2)
+                        RETURNING sql_query
+                        """,
+                        key,
+                        self.ttl,
+                    )
+            except Exception as e:
+                logger.warning(f"Не удалось прочитать кэш SQL из базы данных: {e}")
+                sql_query = None
+
+            if sql_query is not None:
+                self.memory.set(key, sql_query)
+                self.hits += 1
+                return sql_query
+
+        self.misses += 1
+        return None
+
+    async def set(self, question: str, sql_query: str):
+        """Сохраняет SQL для вопроса в памяти и в базе данных."""
+        key = self.make_key(question)
+        self.memory.set(key, sql_query)
+
+        if self.database.pool is None:
+            return
+
+        try:
+            async with self.database.pool.acquire() as conn:
+                await conn.execute(
+                    """
+                    INSERT INTO sql_cache (question_hash, question, sql_query)
+                    VALUES ($1, $2, $3)
+                    ON CONFLICT (question_hash) DO UPDATE
+                    SET sql_query = EXCLUDED.sql_query,
+                        created_at = NOW(),
+                        last_used_at = NOW()
+                    """,
+                    key,
+                    normalize_question(question),
+                    sql_query,
+                )
+
+                self._writes += 1
+                if self._writes % self.CLEANUP_EVERY == 0:
+                    await self._cleanup(conn)
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить кэш SQL в базу данных: {e}")
+
+    async def invalidate(self, question: str):
+        """Удаляет вопрос из кэша (например, если SQL оказался ошибочным)."""
+        key = self.make_key(question)
+        self.memory.pop(key)
+
+        if self.database.pool is None:
+            return
+
+        try:
+            async with self.database.pool.acquire() as conn:
+                await conn.execute("DELETE FROM sql_cache WHERE question_hash = $1", key)
+        except Exception as e:
+            logger.warning(f"Не удалось удалить запись кэша SQL: {e}")
+
+    async def _cleanup(self, conn):
+        """Удаляет устаревшие записи и обрезает таблицу до max_rows."""
+        await conn.execute(
+            "DELETE FROM sql_cache WHERE created_at < NOW() - make_interval(secs => $1)",
+            self.ttl,
+        )
+        await conn.execute(
+            """
+            DELETE FROM sql_cache
+            WHERE question_hash IN (
+                SELECT question_hash FROM sql_cache
+                ORDER BY last_used_at DESC
+                OFFSET $1
+            )
+            """,
+            self.max_rows,
+        )
+
+    def stats(self) -> dict:
+        """Возвращает счетчики попаданий и промахов кэша."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory": self.memory.stats(),
+        }
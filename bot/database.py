@@ -1,6 +1,9 @@
 """Модуль для работы с базой данных PostgreSQL."""
+import asyncio
+import json
 import logging
 import os
+import time
 from pathlib import Path
 from typing import Optional
 from urllib.parse import urlparse
@@ -8,10 +11,80 @@ from urllib.parse import urlparse
 import asyncpg
 from dotenv import load_dotenv
 
+from bot.cache import LRUCache
+from bot.metrics import CACHE_LOOKUPS, REJECTED_QUERIES, bind_database, stage
+from bot.pools import DATABASE_READ_URLS, PoolManager
+from bot.query_log import DB_QUERY_LOG, QueryLog
+from bot.sql_normalizer import normalize_sql, parameterize
+from bot.templates import template_statements
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+MIGRATIONS_DIR = Path(__file__).parent.parent / "migrations"
+
+# Выносить литералы сгенерированных запросов в параметры (подготовленные запросы)
+DB_PARAMETERIZE = os.getenv("DB_PARAMETERIZE", "1") != "0"
+
+# Размер кэша подготовленных запросов на одно подключение
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 256))
+
+# Готовить SQL шаблонов на каждом новом подключении пулов чтения, чтобы первые вопросы
+# не тратили время на разбор запросов и получение типов
+DB_PREPARE_TEMPLATES = os.getenv("DB_PREPARE_TEMPLATES", "1") != "0"
+
+# Ограничение времени одного прогревочного запроса шаблона (мс)
+TEMPLATE_WARMUP_TIMEOUT = 1000
+
+# Часовой пояс сессий: в нем считаются границы дней (DATE(created_at) и переписанные фильтры)
+REPORT_TIMEZONE = os.getenv("REPORT_TIMEZONE", "UTC")
+
+# Размер кэша результатов запросов (число записей) и время жизни записи в секундах
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 2048))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", 3600))
+
+# Ограничение времени одного запроса к данным (мс); 0 - без ограничения
+DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", 10000))
+
+# Наибольшая допустимая оценка стоимости плана (EXPLAIN) для SQL от LLM; 0 - без проверки
+DB_MAX_QUERY_COST = float(os.getenv("DB_MAX_QUERY_COST", 1_000_000))
+
+# Версия данных в load_state и канал NOTIFY, через который загрузчик сообщает о ее смене
+DATA_VERSION_KEY = "data_version"
+DATA_VERSION_CHANNEL = "data_loaded"
+
+# Пауза перед повторным подключением подписки (удваивается при неудачах) и ее максимум, секунды
+DB_LISTEN_RETRY = float(os.getenv("DB_LISTEN_RETRY", 1))
+DB_LISTEN_MAX_RETRY = float(os.getenv("DB_LISTEN_MAX_RETRY", 60))
+
+# Ключ advisory-блокировки, чтобы миграции не выполнялись параллельно из нескольких процессов
+MIGRATIONS_LOCK_KEY = 7_302_001
+
+# Ключ advisory-блокировки начальной загрузки: ее выполняет только один из одновременно запущенных процессов
+INITIAL_LOAD_LOCK_KEY = 7_302_017
+
+
+class QueryFailed(ValueError):
+    """Запрос не выполнился; reason - причина для статистики (timeout, read_only, error)."""
+
+    def __init__(self, message: str, reason: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class QueryTooExpensive(ValueError):
+    """Оценка стоимости плана запроса превышает DB_MAX_QUERY_COST."""
+
+    reason = "cost"
+
+    def __init__(self, cost: float, budget: float):
+        super().__init__(
+            f"Запрос слишком тяжелый: оценка стоимости {cost:.0f} при допустимой {budget:.0f}"
+        )
+        self.cost = cost
+        self.budget = budget
+
 
 def parse_database_url(database_url: str):
     """Парсит DATABASE_URL и возвращает параметры подключения."""
@@ -35,11 +108,94 @@ def parse_database_url(database_url: str):
     }
 
 
+async def apply_migrations(conn) -> list:
+    """
+    Применяет еще не выполненные миграции из каталога migrations.
+
+    Файлы выполняются по порядку имен, каждый в своей транзакции; выполненные
+    миграции записываются в таблицу schema_migrations.
+
+    Returns:
+        Список имен примененных миграций
+    """
+    if not MIGRATIONS_DIR.exists():
+        raise FileNotFoundError(f"Каталог миграций не найден: {MIGRATIONS_DIR}")
+
+    # CREATE TABLE IF NOT EXISTS из нескольких процессов сразу падает на первом запуске
+    async with conn.transaction():
+        await conn.execute("SELECT pg_advisory_xact_lock($1)", MIGRATIONS_LOCK_KEY)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                name VARCHAR(255) PRIMARY KEY,
+                applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+            )
+        """)
+
+    # Обычно все миграции уже выполнены: один запрос вместо транзакции на каждый файл
+    done_before = {row["name"] for row in await conn.fetch("SELECT name FROM schema_migrations")}
+
+    applied = []
+    for migration_file in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        if migration_file.name in done_before:
+            continue
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", MIGRATIONS_LOCK_KEY)
+            done = await conn.fetchval(
+                "SELECT EXISTS (SELECT 1 FROM schema_migrations WHERE name = $1)",
+                migration_file.name,
+            )
+            if done:
+                continue
+
+            logger.info(f"Выполнение миграции {migration_file.name}...")
+            with open(migration_file, "r", encoding="utf-8") as f:
+                await conn.execute(f.read())
+            await conn.execute(
+                "INSERT INTO schema_migrations (name) VALUES ($1)", migration_file.name
+            )
+            applied.append(migration_file.name)
+
+    return applied
+
+
+async def bump_data_version(conn) -> int:
+    """
+    Увеличивает версию данных и уведомляет об этом подключенные процессы.
+
+    Вызывается загрузчиком после изменения videos/video_snapshots; если вызов
+    сделан внутри транзакции, уведомление уйдет только после ее фиксации.
+    """
+    version = await conn.fetchval(
+        """
+        INSERT INTO load_state (key, value, updated_at) VALUES ($1, '1', NOW())
+        ON CONFLICT (key) DO UPDATE
+        SET value = (load_state.value::bigint + 1)::text, updated_at = NOW()
+        RETURNING value::bigint
+        """,
+        DATA_VERSION_KEY,
+    )
+    await conn.execute("SELECT pg_notify($1, $2)", DATA_VERSION_CHANNEL, str(version))
+    return version
+
+
 class Database:
     """Класс для работы с базой данных."""
 
     def __init__(self):
+        # pool - основной сервер (запись, служебные запросы); запросы пользователей - pools.read_pool()
+        self.pools = PoolManager()
         self.pool: Optional[asyncpg.Pool] = None
+        self.result_cache = LRUCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+        self.data_version: Optional[int] = None
+        self.rollups_ready = False
+        self._listener: Optional[asyncpg.Connection] = None
+        self._listen_params: Optional[dict] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        # Запросы шаблонов готовятся только после миграций: до них таблиц может не быть
+        self._templates_ready = False
+        self.query_log: Optional[QueryLog] = (
+            QueryLog(self, statement_timeout=DB_STATEMENT_TIMEOUT) if DB_QUERY_LOG else None
+        )
 
     async def check_tables_exist(self) -> bool:
         """Проверяет, существуют ли таблицы в БД."""
@@ -53,84 +209,357 @@ class Database:
             return bool(result)
 
     async def check_data_exists(self) -> bool:
-        """Проверяет, есть ли данные в таблице videos."""
+        """Проверяет, есть ли данные в таблице videos (не перебирая всю таблицу)."""
         async with self.pool.acquire() as conn:
-            count = await conn.fetchval("SELECT COUNT(*) FROM videos")
-            return count > 0
+            return await conn.fetchval("SELECT EXISTS (SELECT 1 FROM videos)")
 
-    async def init_tables_if_needed(self):
-        """Инициализирует таблицы, если их нет."""
-        try:
-            tables_exist = await self.check_tables_exist()
-            if tables_exist:
-                logger.info("Таблицы уже существуют в базе данных")
-                return
+    async def load_initial_data(self) -> bool:
+        """
+        Загружает данные из файла (load_json_to_db), если таблица videos пуста.
 
-            logger.info("Таблицы не найдены, выполняется инициализация...")
-            migration_file = Path(__file__).parent.parent / "migrations" / "001_create_tables.sql"
-            
-            if not migration_file.exists():
-                logger.error(f"Файл миграции не найден: {migration_file}")
-                logger.error(f"Текущая директория: {Path.cwd()}")
-                logger.error(f"Директория скрипта: {Path(__file__).parent.parent}")
-                raise FileNotFoundError(f"Файл миграции не найден: {migration_file}")
+        Проверка и загрузка идут под advisory-блокировкой: процессы,
+        запущенные одновременно (например, несколько worker), ждут первого
+        и после него видят данные, а не начинают свою полную загрузку.
 
-            logger.info(f"Чтение миграции из {migration_file}...")
+        Returns:
+            True, если данные загружены этим вызовом
+        """
+        async with self.pool.acquire() as conn:
+            await conn.execute("SELECT pg_advisory_lock($1)", INITIAL_LOAD_LOCK_KEY)
+            try:
+                if await conn.fetchval("SELECT EXISTS (SELECT 1 FROM videos)"):
+                    return False
+                logger.info("Таблицы пустые, начинаю загрузку данных...")
+                from setup_db import load_json_to_db
+                await load_json_to_db()
+                return True
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", INITIAL_LOAD_LOCK_KEY)
+
+    async def init_tables_if_needed(self):
+        """Создает таблицы и применяет новые миграции, если они есть."""
+        try:
             async with self.pool.acquire() as conn:
-                with open(migration_file, "r", encoding="utf-8") as f:
-                    sql = f.read()
-                    logger.info("Выполнение SQL миграции...")
-                    await conn.execute(sql)
-            
-            logger.info("Миграция выполнена успешно, таблицы созданы")
+                applied = await apply_migrations(conn)
+
+            if applied:
+                logger.info(f"Применены миграции: {', '.join(applied)}")
+            else:
+                logger.info("Схема базы данных актуальна")
         except Exception as e:
             logger.error(f"Ошибка при инициализации таблиц: {e}", exc_info=True)
             raise
 
-    async def connect(self):
-        """Создает пул подключений к базе данных."""
+    @staticmethod
+    def _connection_params() -> dict:
         database_url = os.getenv("DATABASE_URL")
         if not database_url:
             raise ValueError("DATABASE_URL не установлен в переменных окружения")
+        return parse_database_url(database_url)
 
-        params = parse_database_url(database_url)
+    async def connect_primary(self):
+        """
+        Открывает только пул записи основного сервера и применяет миграции.
 
-        self.pool = await asyncpg.create_pool(
-            user=params["user"],
-            password=params["password"],
-            database=params["database"],
-            host=params["host"],
-            port=params["port"],
-            min_size=1,
-            max_size=10,
+        Для процессов, которые лишь пишут служебные данные (прием обновлений
+        в очередь): без пулов чтения, реплик, подписки на версию данных,
+        журнала запросов и подготовки шаблонов.
+        """
+        await self.pools.connect_primary(
+            self._connection_params(),
+            statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+            server_settings={"timezone": REPORT_TIMEZONE},
         )
+        self.pool = self.pools.primary
+        await self.init_tables_if_needed()
+
+    async def connect(self):
+        """Создает пулы подключений к основному серверу и репликам."""
+        params = self._connection_params()
+        replica_params = [parse_database_url(url.strip()) for url in DATABASE_READ_URLS.split(",") if url.strip()]
+
+        prepare_templates = DB_PREPARE_TEMPLATES and DB_STATEMENT_CACHE_SIZE
+        await self.pools.connect(
+            params,
+            replica_params,
+            read_init=self._prepare_templates if prepare_templates else None,
+            statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+            server_settings={"timezone": REPORT_TIMEZONE},
+        )
+        self.pool = self.pools.primary
         
         # Автоматическая инициализация таблиц при подключении
         await self.init_tables_if_needed()
 
+        # Подключения, открытые до миграций, готовятся сейчас; новые - в read_init
+        self._templates_ready = True
+        if prepare_templates:
+            await self._prepare_read_pools()
+
+        self._listen_params = params
+        listening, _ = await asyncio.gather(self._listen_data_version(), self.check_rollups_ready())
+        if not listening:
+            self._start_reconnect()
+        if self.query_log is not None:
+            self.query_log.start()
+
+    async def _prepare_templates(self, conn: asyncpg.Connection):
+        """
+        Готовит SQL шаблонов на подключении пула чтения.
+
+        Каждый запрос один раз выполняется через fetchval с примером
+        параметров (template_statements): asyncpg разбирает его, получает
+        типы и кладет в кэш подготовленных запросов подключения, откуда его
+        возьмут вопросы пользователей. Запросы к таблицам, которых нет
+        (например, на отстающей реплике), пропускаются.
+        """
+        if not self._templates_ready:
+            return
+        await conn.execute(f"SET statement_timeout = {TEMPLATE_WARMUP_TIMEOUT:d}")
+        try:
+            for query, args in template_statements():
+                try:
+                    await conn.fetchval(query, *args)
+                except asyncpg.PostgresError as e:
+                    logger.debug(f"Не удалось подготовить запрос шаблона: {e}")
+        finally:
+            await conn.execute("RESET statement_timeout")
+
+    async def _prepare_read_pools(self):
+        """Готовит SQL шаблонов на всех уже открытых подключениях пулов чтения."""
+        async def prepare_pool(pool: asyncpg.Pool):
+            # Все подключения берутся одновременно, чтобы каждое было подготовлено
+            connections = [await pool.acquire() for _ in range(pool.get_size())]
+            try:
+                await asyncio.gather(*(self._prepare_templates(conn) for conn in connections))
+            finally:
+                for conn in connections:
+                    await pool.release(conn)
+
+        await asyncio.gather(*(prepare_pool(pool) for _, role, pool in self.pools.pools() if role == "read"))
+
+    async def check_rollups_ready(self) -> bool:
+        """Проверяет, посчитаны ли таблицы-агрегаты в часовом поясе REPORT_TIMEZONE."""
+        try:
+            async with self.pool.acquire() as conn:
+                rollup_timezone = await conn.fetchval(
+                    "SELECT value FROM load_state WHERE key = 'rollup_timezone'"
+                )
+            self.rollups_ready = rollup_timezone == REPORT_TIMEZONE
+        except Exception as e:
+            logger.warning(f"Не удалось проверить таблицы-агрегаты: {e}")
+            self.rollups_ready = False
+        return self.rollups_ready
+
+    async def _listen_data_version(self) -> bool:
+        """
+        Читает текущую версию данных и подписывается на ее изменения.
+
+        Пока подписка не работает, data_version равна None и кэш
+        результатов не используется.
+
+        Returns:
+            True, если подписка установлена
+        """
+        params = self._listen_params
+        listener = None
+        try:
+            listener = await asyncpg.connect(
+                user=params["user"],
+                password=params["password"],
+                database=params["database"],
+                host=params["host"],
+                port=params["port"],
+            )
+            await listener.add_listener(DATA_VERSION_CHANNEL, self._on_data_version)
+            listener.add_termination_listener(self._on_listener_closed)
+
+            version = await listener.fetchval(
+                "SELECT value::bigint FROM load_state WHERE key = $1", DATA_VERSION_KEY
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось подписаться на обновления данных, кэш результатов отключен: {e}")
+            if listener is not None:
+                listener.remove_termination_listener(self._on_listener_closed)
+                listener.terminate()
+            self.data_version = None
+            return False
+
+        self._listener = listener
+        self.data_version = version or 0
+        return True
+
+    def _on_data_version(self, connection, pid, channel, payload):
+        """Обрабатывает NOTIFY от загрузчика: новая версия данных делает кэш неактуальным."""
+        try:
+            self.data_version = int(payload)
+        except ValueError:
+            self.data_version = (self.data_version or 0) + 1
+        self.result_cache.clear()
+        self.pools.require_fresh_reads()
+        logger.info(f"Данные обновлены (версия {self.data_version}), кэш результатов очищен")
+        # Загрузчик мог пересобрать агрегаты в другом часовом поясе
+        asyncio.get_running_loop().create_task(self.check_rollups_ready())
+
+    def _on_listener_closed(self, connection):
+        """Подписка потеряна: без нее кэш мог бы отдавать устаревшие результаты."""
+        logger.warning("Подключение подписки на обновления данных закрыто, кэш результатов отключен")
+        self._listener = None
+        self.data_version = None
+        self.result_cache.clear()
+        self._start_reconnect()
+
+    def _start_reconnect(self):
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect_listener())
+
+    async def _reconnect_listener(self):
+        """
+        Переподключает подписку с растущей паузой между попытками.
+
+        Пока подписки не было, уведомления загрузчика могли потеряться,
+        поэтому после переподключения версия данных читается заново,
+        а флаг агрегатов и чтение с реплик проверяются как после загрузки.
+        """
+        delay = DB_LISTEN_RETRY
+        while True:
+            await asyncio.sleep(delay)
+            if not await self._listen_data_version():
+                delay = min(delay * 2, DB_LISTEN_MAX_RETRY)
+                continue
+
+            self.result_cache.clear()
+            self.pools.require_fresh_reads()
+            await self.check_rollups_ready()
+            # Подключение могло закрыться снова, пока задача еще не завершилась
+            if self._listener is not None:
+                logger.info(f"Подписка на обновления данных восстановлена (версия {self.data_version})")
+                return
+            delay = DB_LISTEN_RETRY
+
     async def disconnect(self):
-        """Закрывает пул подключений."""
-        if self.pool:
-            await self.pool.close()
+        """Закрывает пулы подключений."""
+        if self.query_log is not None:
+            await self.query_log.stop()
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            await asyncio.gather(self._reconnect_task, return_exceptions=True)
+            self._reconnect_task = None
+        if self._listener is not None:
+            self._listener.remove_termination_listener(self._on_listener_closed)
+            await self._listener.close()
+            self._listener = None
+        await self.pools.close()
+        self.pool = None
 
-    async def execute_query(self, query: str) -> Optional[float]:
+    async def execute_query(self, query: str, *args) -> Optional[float]:
         """
         Выполняет SQL запрос и возвращает числовой результат.
 
+        Запрос без параметров (текст от LLM) сначала приводится к форме
+        с параметрами $1..$n (см. sql_normalizer.parameterize). Такие запросы
+        выполняются как подготовленные: asyncpg кэширует их на каждом
+        подключении, и вопросы, отличающиеся только значениями, используют
+        один и тот же план. Если параметризованная форма не выполняется
+        (например, из-за несовпадения типов), запрос выполняется как есть.
+
+        Результаты кэшируются по нормализованному запросу, параметрам и
+        версии данных, которую увеличивает загрузчик, поэтому повторные
+        аналитические вопросы не доходят до PostgreSQL.
+
         Args:
             query: SQL запрос, который должен вернуть одно число
+            *args: Значения параметров $1..$n запроса
 
         Returns:
             Числовой результат запроса или None
         """
-        async with self.pool.acquire() as conn:
+        prepared = None
+        if not args and DB_PARAMETERIZE:
+            prepared = parameterize(query)
+
+        cache_key = None
+        if self.data_version is not None:
+            if prepared:
+                cache_key = (self.data_version, prepared[0], tuple(prepared[1]))
+            else:
+                cache_key = (self.data_version, normalize_sql(query), tuple(args))
+            cached = self.result_cache.get(cache_key)
+            CACHE_LOOKUPS.labels("result", "hit" if cached is not None else "miss").inc()
+            if cached is not None:
+                return cached
+
+        started = time.perf_counter()
+        try:
+            with stage("sql"):
+                result = await self._fetch_number(query, args, prepared)
+        except (QueryFailed, QueryTooExpensive) as e:
+            # Остановленные и отклоненные запросы - как раз те, что нужно найти в query_stats
+            self._log_query(query, args, prepared, started, e.reason)
+            raise
+        self._log_query(query, args, prepared, started)
+        if cache_key is not None and cache_key[0] == self.data_version:
+            self.result_cache.set(cache_key, result)
+        return result
+
+    def _log_query(
+        self, query: str, args: tuple, prepared: Optional[tuple], started: float, error: Optional[str] = None
+    ):
+        """Передает запрос в журнал запросов (error - причина, если запрос не выполнился)."""
+        if self.query_log is not None:
+            shape = prepared[0] if prepared else normalize_sql(query)
+            self.query_log.record(query, args, shape, time.perf_counter() - started, error)
+
+    async def _fetch_number(self, query: str, args: tuple, prepared: Optional[tuple]) -> float:
+        """Выполняет запрос (по возможности в параметризованной форме) и приводит ответ к числу."""
+        # Стоимость проверяется только у SQL от LLM; запросы шаблонов приходят с параметрами
+        check_cost = not args and DB_MAX_QUERY_COST > 0
+        async with self.pools.read_pool().acquire() as conn:
             try:
-                result = await conn.fetchval(query)
-                if result is None:
-                    return 0.0
-                return float(result)
+                if prepared and prepared[1]:
+                    try:
+                        return await self._fetch_guarded(conn, prepared[0], prepared[1], check_cost)
+                    except (asyncpg.SyntaxOrAccessError, asyncpg.DataError) as e:
+                        logger.info(f"Параметризованная форма запроса не подошла ({e}), выполняю как есть")
+                return await self._fetch_guarded(conn, query, args, check_cost)
+            except QueryTooExpensive:
+                REJECTED_QUERIES.labels("cost").inc()
+                raise
+            except (asyncpg.QueryCanceledError, asyncio.TimeoutError):
+                REJECTED_QUERIES.labels("timeout").inc()
+                raise QueryFailed(
+                    f"Запрос выполнялся дольше {DB_STATEMENT_TIMEOUT / 1000:g} с и был остановлен. "
+                    "Попробуйте сузить вопрос.",
+                    "timeout",
+                )
+            except asyncpg.ReadOnlySQLTransactionError:
+                REJECTED_QUERIES.labels("read_only").inc()
+                raise QueryFailed("Запрос пытается изменить данные, такие запросы не выполняются.", "read_only")
             except Exception as e:
-                raise ValueError(f"Ошибка выполнения запроса: {str(e)}")
+                raise QueryFailed(f"Ошибка выполнения запроса: {str(e)}", "error")
+
+    async def _fetch_guarded(self, conn, query: str, args, check_cost: bool) -> float:
+        """
+        Выполняет запрос в read-only транзакции с ограничением времени.
+
+        statement_timeout останавливает запрос на сервере, а таймаут asyncpg
+        (чуть больше) - если сервер не ответил; при отмене задачи asyncpg
+        отменяет запрос на сервере, и подключение сразу возвращается в пул.
+        """
+        timeout = DB_STATEMENT_TIMEOUT / 1000 + 1 if DB_STATEMENT_TIMEOUT else None
+        async with conn.transaction(readonly=True):
+            if DB_STATEMENT_TIMEOUT:
+                await conn.execute(f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT:d}")
+            if check_cost:
+                explain = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *args, timeout=timeout)
+                cost = json.loads(explain)[0]["Plan"]["Total Cost"]
+                if cost > DB_MAX_QUERY_COST:
+                    raise QueryTooExpensive(cost, DB_MAX_QUERY_COST)
+            result = await conn.fetchval(query, *args, timeout=timeout)
+
+        if result is None:
+            return 0.0
+        return float(result)
 
     async def execute_migration(self, migration_file: str):
         """Выполняет SQL миграцию из файла."""
@@ -141,5 +570,6 @@ class Database:
 
 
 db = Database()
+bind_database(db)
 
 #
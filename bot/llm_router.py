@@ -0,0 +1,348 @@
+"""Маршрутизация запросов к LLM между провайдерами и моделями по задержке и ошибкам."""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Optional
+
+import google.generativeai as genai
+
+from bot.metrics import LLM_REQUESTS, LLM_SECONDS, count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Модели, которые используются, если задан ключ провайдера (через запятую)
+# (gemini-pro не поддерживает system_instruction и отвечает на каждый запрос 400)
+GEMINI_MODELS = os.getenv("GEMINI_MODELS", "gemini-1.5-flash,gemini-1.5-pro")
+OPENAI_MODELS = os.getenv("OPENAI_MODELS", "gpt-4o-mini")
+
+# По скольким последним запросам считаются задержка и доля ошибок модели
+LLM_STATS_WINDOW = int(os.getenv("LLM_STATS_WINDOW", 50))
+
+# Отправлять дублирующий запрос другой модели, если первая отвечает дольше своего p95
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") != "0"
+
+# Задержка дублирующего запроса, пока у модели мало замеров для p95 (секунды)
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", 5))
+LLM_HEDGE_MIN_SAMPLES = 10
+
+# Сколько разных моделей пробуется для одного вопроса
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", 3))
+
+# Пауза после ошибки модели (удваивается при повторных ошибках) и ее максимум, секунды
+LLM_COOLDOWN = float(os.getenv("LLM_COOLDOWN", 5))
+LLM_MAX_COOLDOWN = float(os.getenv("LLM_MAX_COOLDOWN", 300))
+
+
+def _is_permanent(error: Exception) -> bool:
+    """
+    Ошибки, которые не пройдут сами (нет модели, нет доступа, неверный ключ,
+    модель не принимает запрос в таком виде - 400 invalid argument).
+    """
+    error_str = str(error)
+    error_lower = error_str.lower()
+    # google.api_core хранит HTTP-код в code, openai - в status_code
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return (
+        status == 400 or error_str.startswith("400 ")
+        or "invalid argument" in error_lower or "invalid_argument" in error_lower
+        or "403" in error_str or "401" in error_str or "forbidden" in error_lower
+        or "model_not_found" in error_lower or "does not exist" in error_lower
+        or "not found" in error_lower or "api_key" in error_lower
+    )
+
+
+class LLMBackendError(Exception):
+    """Ошибка запроса к конкретной модели; исходная ошибка в error."""
+
+    def __init__(self, backend: "LLMBackend", error: Exception):
+        super().__init__(str(error))
+        self.backend = backend
+        self.error = error
+
+
+class LLMBackend:
+    """Одна модель одного провайдера и скользящая статистика ее ответов."""
+
+    def __init__(self, provider: str, model: str, client, system_prompt: str, window: int = LLM_STATS_WINDOW):
+        self.provider = provider
+        self.model = model
+        self.client = client
+        self.system_prompt = system_prompt
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_errors = 0
+        self.cooldown_until = 0.0
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}/{self.model}"
+
+    async def request(self, user_prompt: str, timeout: float) -> str:
+        """Отправляет модели переменную часть промпта и возвращает текст ответа."""
+        if self.provider == "gemini":
+            # Системный промпт задан в модели (system_instruction) и не склеивается с вопросом
+            # Асинхронный вызов SDK: не занимает поток пула на время ожидания ответа
+            response = await self.client.generate_content_async(
+                user_prompt,
+                generation_config=genai.types.GenerationConfig(
+                    temperature=0.1,
+                    max_output_tokens=500,
+                ),
+                request_options={"timeout": timeout},
+            )
+            usage = response.usage_metadata
+            count_tokens(
+                self.provider, self.model,
+                prompt=usage.prompt_token_count,
+                completion=usage.candidates_token_count,
+                cached=getattr(usage, "cached_content_token_count", 0),
+            )
+            return response.text.strip()
+
+        # Одинаковое системное сообщение в начале - префикс, который OpenAI кэширует сам
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            temperature=0.1,
+            max_tokens=500,
+        )
+        if response.usage is not None:
+            details = getattr(response.usage, "prompt_tokens_details", None)
+            count_tokens(
+                self.provider, self.model,
+                prompt=response.usage.prompt_tokens,
+                completion=response.usage.completion_tokens,
+                cached=getattr(details, "cached_tokens", 0) or 0,
+            )
+        return response.choices[0].message.content.strip()
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Квантиль задержки по последним ответам или None, если замеров нет."""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def score(self) -> float:
+        """Ожидаемая задержка с штрафом за ошибки; модели без замеров пробуются первыми."""
+        return (self.percentile(0.5) or 0.0) * (1 + 4 * self.error_rate)
+
+    def record_success(self, latency: float):
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.consecutive_errors = 0
+        self.cooldown_until = 0.0
+
+    def record_failure(self, error: Exception):
+        self.outcomes.append(False)
+        self.consecutive_errors += 1
+        if _is_permanent(error):
+            cooldown = LLM_MAX_COOLDOWN
+        else:
+            cooldown = min(LLM_COOLDOWN * 2 ** (self.consecutive_errors - 1), LLM_MAX_COOLDOWN)
+        self.cooldown_until = time.monotonic() + cooldown
+        logger.warning(f"Модель {self.name} ответила ошибкой, пауза {cooldown:g} с: {error}")
+
+    def record_cancelled(self, elapsed: float):
+        # Проигравший дублирующий запрос: ответ занял бы не меньше elapsed,
+        # без этого замера медленная модель выглядела бы быстрее, чем она есть
+        self.latencies.append(elapsed)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "error_rate": self.error_rate,
+            "samples": len(self.latencies),
+            "cooling_down": not self.available(time.monotonic()),
+        }
+
+
+class LLMRouter:
+    """
+    Выбирает для каждого вопроса самую быструю исправную модель.
+
+    Все настроенные модели всех провайдеров используются одновременно:
+    порядок определяется медианной задержкой и долей ошибок за последние
+    запросы, а модель после ошибки на время выводится из ротации. Если
+    модель не ответила за свой p95, вопрос дублируется следующей модели и
+    берется первый ответ; при ошибке вопрос переходит к следующей модели.
+
+    semaphore ограничивает число одновременных запросов к моделям: слот
+    занимает каждый запущенный запрос, включая дублирующие, а не вопрос
+    целиком. Когда все слоты заняты, вопрос не дублируется.
+    """
+
+    def __init__(
+        self,
+        backends: list,
+        hedge: bool = LLM_HEDGE,
+        max_attempts: int = LLM_MAX_ATTEMPTS,
+        semaphore: Optional[asyncio.Semaphore] = None,
+    ):
+        self.backends = backends
+        self.hedge = hedge
+        self.max_attempts = max_attempts
+        self.semaphore = semaphore
+        self.hedged = 0
+
+    def ranked(self, exclude=()) -> list:
+        """Модели по возрастанию ожидаемой задержки; если все на паузе - по окончанию паузы."""
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b not in exclude]
+        ready = [b for b in candidates if b.available(now)]
+        if ready:
+            return sorted(ready, key=lambda b: b.score())
+        return sorted(candidates, key=lambda b: b.cooldown_until)
+
+    def hedge_delay(self, backend: LLMBackend) -> float:
+        if len(backend.latencies) >= LLM_HEDGE_MIN_SAMPLES:
+            return backend.percentile(0.95)
+        return LLM_HEDGE_DELAY
+
+    async def _call(self, backend: LLMBackend, user_prompt: str, timeout: float) -> str:
+        if self.semaphore is None:
+            return await self._call_backend(backend, user_prompt, timeout)
+        async with self.semaphore:
+            return await self._call_backend(backend, user_prompt, timeout)
+
+    async def _call_backend(self, backend: LLMBackend, user_prompt: str, timeout: float) -> str:
+        # Время ожидания слота семафора не входит в задержку модели
+        started = time.monotonic()
+        try:
+            text = await backend.request(user_prompt, timeout)
+        except asyncio.CancelledError:
+            backend.record_cancelled(time.monotonic() - started)
+            LLM_REQUESTS.labels(backend.name, "cancelled").inc()
+            raise
+        except Exception as e:
+            backend.record_failure(e)
+            LLM_REQUESTS.labels(backend.name, "error").inc()
+            raise LLMBackendError(backend, e) from e
+        latency = time.monotonic() - started
+        backend.record_success(latency)
+        LLM_REQUESTS.labels(backend.name, "ok").inc()
+        LLM_SECONDS.labels(backend.name).observe(latency)
+        return text
+
+    async def request(self, user_prompt: str, timeout: float) -> tuple:
+        """
+        Получает ответ LLM на промпт с вопросом (системный промпт задан у моделей).
+
+        Returns:
+            Кортеж (текст ответа, LLMBackend, который ответил)
+
+        Raises:
+            asyncio.TimeoutError: Ни одна модель не ответила за timeout секунд
+            LLMBackendError: Все попытки завершились ошибкой (последняя из них)
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        tried = []
+        running = {}
+        last_error = None
+
+        def launch(spare: bool = False) -> bool:
+            # spare - дополнительный запрос, пока другой еще идет: модель на паузе для него не годится
+            if len(tried) >= self.max_attempts:
+                return False
+            if spare and self.semaphore is not None and self.semaphore.locked():
+                return False
+            ranked = self.ranked(exclude=tried)
+            if spare:
+                ranked = [b for b in ranked if b.available(time.monotonic())]
+            if not ranked:
+                return False
+            backend = ranked[0]
+            tried.append(backend)
+            task = asyncio.ensure_future(
+                self._call(backend, user_prompt, max(deadline - loop.time(), 0.1))
+            )
+            running[task] = backend
+            return True
+
+        launch()
+        hedge_at = loop.time() + self.hedge_delay(tried[0]) if self.hedge else None
+
+        try:
+            while running:
+                now = loop.time()
+                if now >= deadline:
+                    raise asyncio.TimeoutError()
+                wait = deadline - now
+                if hedge_at is not None:
+                    wait = min(wait, max(hedge_at - now, 0))
+
+                done, _ = await asyncio.wait(running, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if hedge_at is not None and loop.time() >= hedge_at:
+                        hedge_at = None
+                        if launch(spare=True):
+                            self.hedged += 1
+                            logger.info(f"{tried[0].name} отвечает дольше p95, дублируем запрос в {tried[-1].name}")
+                    continue
+
+                for task in done:
+                    backend = running.pop(task)
+                    try:
+                        return task.result(), backend
+                    except LLMBackendError as e:
+                        last_error = e
+
+                # Упавший запрос заменяем следующей моделью; после срабатывания
+                # дублирования держим две модели в работе
+                if not running or (self.hedge and hedge_at is None):
+                    launch(spare=bool(running))
+
+            raise last_error
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def close(self):
+        """Закрывает HTTP-клиенты провайдеров."""
+        closed = set()
+        for backend in self.backends:
+            if backend.provider == "openai" and id(backend.client) not in closed:
+                closed.add(id(backend.client))
+                await backend.client.close()
+
+    def stats(self) -> list:
+        return [backend.stats() for backend in self.backends]
+
+
+def build_backends(system_prompt: str, timeout: float) -> list:
+    """Создает модели всех провайдеров, для которых заданы ключи в окружении."""
+    backends = []
+
+    gemini_api_key = os.getenv("GEMINI_API_KEY")
+    if gemini_api_key:
+        genai.configure(api_key=gemini_api_key)
+        for model in filter(None, (m.strip() for m in GEMINI_MODELS.split(","))):
+            client = genai.GenerativeModel(model, system_instruction=system_prompt)
+            backends.append(LLMBackend("gemini", model, client, system_prompt))
+
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if openai_api_key:
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(api_key=openai_api_key, timeout=timeout)
+        for model in filter(None, (m.strip() for m in OPENAI_MODELS.split(","))):
+            backends.append(LLMBackend("openai", model, client, system_prompt))
+
+    return backends
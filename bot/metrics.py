@@ -0,0 +1,117 @@
+"""Метрики Prometheus и трассировка этапов обработки вопроса."""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from aiohttp import web
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Этапы: receive - от отправки сообщения до начала обработки, cache - поиск SQL в кэше,
+# llm - генерация SQL, sql - выполнение запроса, reply - отправка ответа, total - весь вопрос
+STAGE_SECONDS = Histogram(
+    "bot_stage_seconds",
+    "Длительность этапа обработки вопроса",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+QUESTIONS = Counter("bot_questions_total", "Обработанные вопросы по исходу", ["outcome"])
+CACHE_LOOKUPS = Counter("bot_cache_lookups_total", "Обращения к кэшам", ["cache", "result"])
+REJECTED_QUERIES = Counter("db_rejected_queries_total", "Запросы, остановленные защитой БД", ["reason"])
+
+LLM_REQUESTS = Counter("llm_requests_total", "Запросы к моделям по исходу", ["backend", "outcome"])
+LLM_SECONDS = Histogram(
+    "llm_request_seconds",
+    "Длительность запроса к модели",
+    ["backend"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30),
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Токены по провайдерам и моделям", ["provider", "model", "kind"])
+
+STARTUP_SECONDS = Gauge("bot_startup_seconds", "Длительность этапов запуска до готовности к вопросам", ["phase"])
+
+SCHEDULER_IN_FLIGHT = Gauge("scheduler_in_flight", "Вопросы в обработке")
+SCHEDULER_QUEUED = Gauge("scheduler_queued", "Вопросы в очереди планировщика")
+
+
+class Trace:
+    """Длительности этапов одного вопроса для строки в логе."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stages = {}
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def summary(self) -> str:
+        parts = ", ".join(f"{stage}={seconds * 1000:.0f}мс" for stage, seconds in self.stages.items())
+        return f"{self.name}: {parts}"
+
+
+# Трассировка текущего вопроса; задачи asyncio получают копию контекста при создании
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def observe(stage: str, seconds: float):
+    """Записывает длительность этапа в гистограмму и в трассировку текущего вопроса."""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    """Замеряет блок кода как этап обработки вопроса."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+def count_tokens(provider: str, model: str, prompt: int = 0, completion: int = 0, cached: int = 0):
+    """Учитывает токены ответа модели (cached - часть prompt, взятая из кэша провайдера)."""
+    for kind, value in (("prompt", prompt), ("completion", completion), ("cached", cached)):
+        if value:
+            LLM_TOKENS.labels(provider, model, kind).inc(value)
+
+
+class PoolCollector:
+    """Показатели всех пулов подключений (основной сервер и реплики) с метками pool и role."""
+
+    def __init__(self, database):
+        self.database = database
+
+    def collect(self):
+        families = {
+            "size": GaugeMetricFamily("db_pool_size", "Открытые подключения пула", labels=["pool", "role"]),
+            "idle": GaugeMetricFamily("db_pool_idle", "Свободные подключения пула", labels=["pool", "role"]),
+            "max": GaugeMetricFamily("db_pool_max_size", "Максимальный размер пула", labels=["pool", "role"]),
+        }
+        for name, role, pool in self.database.pools.pools():
+            families["size"].add_metric([name, role], pool.get_size())
+            families["idle"].add_metric([name, role], pool.get_idle_size())
+            families["max"].add_metric([name, role], pool.get_max_size())
+        return list(families.values())
+
+
+def bind_database(database):
+    """Считает показатели пулов подключений в момент чтения /metrics."""
+    REGISTRY.register(PoolCollector(database))
+
+
+def bind_scheduler(scheduler):
+    """Считает загрузку планировщика вопросов в момент чтения /metrics."""
+    SCHEDULER_IN_FLIGHT.set_function(lambda: scheduler.in_flight)
+    SCHEDULER_QUEUED.set_function(lambda: scheduler.queued)
+
+
+async def metrics_endpoint(request: web.Request) -> web.Response:
+    """Endpoint /metrics в формате Prometheus."""
+    return web.Response(body=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
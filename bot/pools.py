@@ -0,0 +1,220 @@
+"""Пулы подключений: запись на основной сервер, чтение с реплик с учетом их отставания."""
+import asyncio
+import logging
+import os
+from typing import Optional
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Реплики для запросов пользователей (DATABASE_URL через запятую); без них чтение идет на основной сервер
+DATABASE_READ_URLS = os.getenv("DATABASE_READ_URLS", "")
+
+# Размеры пулов: чтение - запросы пользователей, запись - кэши, статистика, очередь обновлений
+DB_READ_POOL_MIN = int(os.getenv("DB_READ_POOL_MIN", 2))
+DB_READ_POOL_MAX = int(os.getenv("DB_READ_POOL_MAX", 10))
+DB_WRITE_POOL_MIN = int(os.getenv("DB_WRITE_POOL_MIN", 1))
+DB_WRITE_POOL_MAX = int(os.getenv("DB_WRITE_POOL_MAX", 5))
+
+# Реплика, отстающая больше чем на столько секунд, не получает запросы
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", 30))
+
+# Как часто проверяется состояние реплик (секунды)
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", 5))
+
+# Отставание реплики (0, если она применила все полученное) и дошла ли она до позиции WAL $1
+REPLICA_STATE_SQL = """
+    SELECT
+        CASE
+            WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+        END AS lag,
+        $1::text IS NULL OR NOT pg_is_in_recovery() OR pg_last_wal_replay_lsn() >= $1::text::pg_lsn AS caught_up
+"""
+
+
+class Replica:
+    """Пул подключений к реплике и ее последнее известное состояние."""
+
+    def __init__(self, name: str, pool: asyncpg.Pool):
+        self.name = name
+        self.pool = pool
+        self.healthy = True
+        self.lag = 0.0
+        self.caught_up = True
+
+    @property
+    def usable(self) -> bool:
+        return self.healthy and self.caught_up and self.lag <= DB_REPLICA_MAX_LAG
+
+    @property
+    def load(self) -> float:
+        """Доля занятых подключений пула."""
+        return (self.pool.get_size() - self.pool.get_idle_size()) / self.pool.get_max_size()
+
+
+class PoolManager:
+    """
+    Пулы подключений приложения.
+
+    primary - пул основного сервера для записи и служебных запросов.
+    Запросы пользователей идут в отдельный пул чтения: на наименее
+    загруженную исправную реплику из DATABASE_READ_URLS, а если реплик нет
+    или все они отстают - в пул чтения основного сервера. Так загрузка и
+    служебные записи не занимают подключения, нужные для ответов.
+
+    После загрузки новых данных реплики не используются, пока не применят
+    WAL до позиции, на которой загрузка зафиксирована, поэтому кэш
+    результатов не заполняется старыми ответами.
+    """
+
+    def __init__(self):
+        self.primary: Optional[asyncpg.Pool] = None
+        self.primary_read: Optional[asyncpg.Pool] = None
+        self.replicas = []
+        self._min_lsn: Optional[str] = None
+        # Номер последнего изменения данных, для которого позиция WAL еще не прочитана
+        self._lsn_generation = 0
+        self._lsn_pending = False
+        self._lsn_task: Optional[asyncio.Task] = None
+        self._monitor: Optional[asyncio.Task] = None
+
+    async def connect(self, params: dict, replica_params: list, read_init=None, **pool_kwargs):
+        """
+        Открывает пулы основного сервера и реплик.
+
+        Все пулы открываются одновременно, каждый сразу до рабочего размера
+        (min_size); asyncpg открывает подключения пула параллельно.
+
+        Args:
+            params: Параметры подключения к основному серверу
+            replica_params: Параметры подключения к репликам
+            read_init: Корутина для каждого нового подключения пулов чтения
+            **pool_kwargs: Общие настройки пулов (statement_cache_size, server_settings)
+        """
+        def read_pool(connection: dict):
+            return asyncpg.create_pool(
+                **connection, min_size=DB_READ_POOL_MIN, max_size=DB_READ_POOL_MAX, init=read_init, **pool_kwargs
+            )
+
+        primary, primary_read, *replicas = await asyncio.gather(
+            asyncpg.create_pool(**params, min_size=DB_WRITE_POOL_MIN, max_size=DB_WRITE_POOL_MAX, **pool_kwargs),
+            read_pool(params),
+            *(read_pool(replica) for replica in replica_params),
+            return_exceptions=True,
+        )
+        for pool in (primary, primary_read):
+            if isinstance(pool, BaseException):
+                for opened in (primary, primary_read, *replicas):
+                    if not isinstance(opened, BaseException):
+                        await opened.close()
+                raise pool
+        self.primary = primary
+        self.primary_read = primary_read
+
+        for replica, pool in zip(replica_params, replicas):
+            name = f"{replica['host']}:{replica['port']}"
+            if isinstance(pool, BaseException):
+                logger.warning(f"Реплика {name} недоступна, чтение пойдет на основной сервер: {pool}")
+                continue
+            self.replicas.append(Replica(name, pool))
+
+        if self.replicas:
+            await self.check_replicas()
+            self._monitor = asyncio.get_running_loop().create_task(self._monitor_replicas())
+            logger.info(f"Пулы чтения: {', '.join(r.name for r in self.replicas)}")
+
+    async def connect_primary(self, params: dict, **pool_kwargs):
+        """Открывает только пул записи основного сервера (без пулов чтения и реплик)."""
+        self.primary = await asyncpg.create_pool(
+            **params, min_size=DB_WRITE_POOL_MIN, max_size=DB_WRITE_POOL_MAX, **pool_kwargs
+        )
+
+    def read_pool(self) -> asyncpg.Pool:
+        """Пул для запроса пользователя: наименее загруженная годная реплика или основной сервер."""
+        usable = [replica for replica in self.replicas if replica.usable]
+        if not usable:
+            return self.primary_read
+        return min(usable, key=lambda replica: replica.load).pool
+
+    def require_fresh_reads(self):
+        """
+        Данные изменились: реплики не используются, пока не догонят основной сервер.
+
+        Вызывается синхронно (из обработчика NOTIFY), позиция WAL запрашивается в фоне.
+        Пока она не прочитана, реплики считаются отстающими.
+        """
+        if not self.replicas:
+            return
+        self._lsn_generation += 1
+        self._lsn_pending = True
+        for replica in self.replicas:
+            replica.caught_up = False
+        if self._lsn_task is None or self._lsn_task.done():
+            self._lsn_task = asyncio.get_running_loop().create_task(self._require_current_lsn())
+
+    async def _require_current_lsn(self):
+        """
+        Читает позицию WAL основного сервера, повторяя попытки при ошибках.
+
+        Если за время запроса пришло новое изменение, позиция могла быть
+        прочитана до его фиксации, поэтому она запрашивается заново.
+        """
+        while True:
+            generation = self._lsn_generation
+            try:
+                lsn = await self.primary.fetchval("SELECT pg_current_wal_lsn()::text", timeout=2)
+            except Exception as e:
+                logger.warning(f"Не удалось получить позицию WAL основного сервера, реплики не используются: {e}")
+                await asyncio.sleep(DB_REPLICA_CHECK_INTERVAL)
+                continue
+            if generation != self._lsn_generation:
+                continue
+            self._min_lsn = lsn
+            self._lsn_pending = False
+            break
+        await self.check_replicas()
+
+    async def check_replicas(self):
+        """Обновляет доступность, отставание и актуальность реплик."""
+        for replica in self.replicas:
+            min_lsn = self._min_lsn
+            try:
+                state = await replica.pool.fetchrow(REPLICA_STATE_SQL, min_lsn, timeout=2)
+            except Exception as e:
+                if replica.healthy:
+                    logger.warning(f"Реплика {replica.name} не отвечает: {e}")
+                replica.healthy = False
+                continue
+            if not replica.healthy:
+                logger.info(f"Реплика {replica.name} снова доступна")
+            replica.healthy = True
+            replica.lag = float(state["lag"])
+            # Без позиции WAL после изменения данных нельзя проверить, что реплика его применила
+            # Позиция могла смениться, пока шел запрос: тогда ответ реплики уже ничего не доказывает
+            replica.caught_up = state["caught_up"] and not self._lsn_pending and min_lsn == self._min_lsn
+
+    async def _monitor_replicas(self):
+        while True:
+            await asyncio.sleep(DB_REPLICA_CHECK_INTERVAL)
+            await self.check_replicas()
+
+    def pools(self) -> list:
+        """Все пулы с их ролями: (имя, роль, пул)."""
+        result = [("primary", "write", self.primary), ("primary", "read", self.primary_read)]
+        result += [(replica.name, "read", replica.pool) for replica in self.replicas]
+        return [(name, role, pool) for name, role, pool in result if pool is not None]
+
+    async def close(self):
+        """Останавливает проверку реплик и закрывает все пулы."""
+        for task in (self._monitor, self._lsn_task):
+            if task is not None:
+                task.cancel()
+        self._monitor = None
+        self._lsn_task = None
+        for _, _, pool in self.pools():
+            await pool.close()
+        self.primary = None
+        self.primary_read = None
+        self.replicas = []
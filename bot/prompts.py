@@ -0,0 +1,110 @@
+"""Промпт для преобразования вопросов в SQL: постоянная часть и подбор примеров под вопрос."""
+import os
+import re
+
+from bot.cache import normalize_question
+from bot.templates import MONTHS
+
+# Сколько примеров вопрос -> SQL добавлять к вопросу
+LLM_FEW_SHOT = int(os.getenv("LLM_FEW_SHOT", 2))
+
+# Постоянная часть промпта: одинакова для всех вопросов, поэтому идет первой и
+# может кэшироваться провайдером (system_instruction у Gemini, префикс у OpenAI).
+# Таблиц-агрегатов в нем нет: они верны только при rollups_ready, а промпт и кэш
+# вопрос -> SQL от этого не зависят; агрегаты используются только в шаблонах
+SYSTEM_PROMPT = """Преобразуй вопрос на русском в один SQL запрос PostgreSQL, возвращающий одно число. Ответ - только SQL.
+
+Схема (TIMESTAMP WITH TIME ZONE, счетчики INTEGER):
+videos - итоговая статистика видео: id UUID, creator_id VARCHAR, video_created_at (публикация), views_count, likes_count, comments_count, reports_count
+video_snapshots - почасовые замеры: id, video_id -> videos.id, created_at (время замера), views_count, likes_count, comments_count, reports_count (значения на момент замера), delta_views_count, delta_likes_count, delta_comments_count, delta_reports_count (приращение с прошлого замера)
+
+Правила:
+- Используй COUNT, SUM или другую агрегатную функцию; суммы оборачивай в COALESCE(..., 0)
+- Итоговые значения и дата публикации (video_created_at) - в videos; прирост (delta_*) и время замера (created_at) - в video_snapshots
+- Уникальные видео: COUNT(DISTINCT video_id) или COUNT(DISTINCT id)
+- Не оборачивай колонки дат в функции в WHERE; день "28 ноября 2025" - created_at >= '2025-11-28' AND created_at < '2025-11-29', "с 1 по 5 ноября 2025" включительно - >= '2025-11-01' AND < '2025-11-06'"""
+
+EXAMPLES = [
+    (
+        "Сколько всего видео есть в системе?",
+        "SELECT COUNT(*) FROM videos",
+    ),
+    (
+        "Сколько видео у креатора с id abc123 вышло с 1 ноября 2025 по 5 ноября 2025 включительно?",
+        "SELECT COUNT(*) FROM videos WHERE creator_id = 'abc123' "
+        "AND video_created_at >= '2025-11-01' AND video_created_at < '2025-11-06'",
+    ),
+    (
+        "Сколько видео набрало больше 100000 просмотров за всё время?",
+        "SELECT COUNT(*) FROM videos WHERE views_count > 100000",
+    ),
+    (
+        "На сколько просмотров в сумме выросли все видео 28 ноября 2025?",
+        "SELECT COALESCE(SUM(delta_views_count), 0) FROM video_snapshots "
+        "WHERE created_at >= '2025-11-28' AND created_at < '2025-11-29'",
+    ),
+    (
+        "Сколько разных видео получали новые просмотры 27 ноября 2025?",
+        "SELECT COUNT(DISTINCT video_id) FROM video_snapshots "
+        "WHERE created_at >= '2025-11-27' AND created_at < '2025-11-28' AND delta_views_count > 0",
+    ),
+    (
+        "Сколько разных креаторов опубликовали видео в ноябре 2025?",
+        "SELECT COUNT(DISTINCT creator_id) FROM videos "
+        "WHERE video_created_at >= '2025-11-01' AND video_created_at < '2025-12-01'",
+    ),
+    (
+        "Сколько замеров статистики было сделано 28 ноября 2025 с 10:00 до 15:00?",
+        "SELECT COUNT(*) FROM video_snapshots "
+        "WHERE created_at >= '2025-11-28 10:00' AND created_at < '2025-11-28 15:00'",
+    ),
+]
+
+# Слова, которые есть почти в каждом вопросе и не помогают выбрать пример
+_STOP_STEMS = {"сколь", "всего", "видео", "котор", "разны"}
+# Месяцы в любом падеже ("ноября", "в ноябре") есть почти во всех примерах
+_MONTH_STEMS = {month[:4] for month in MONTHS}
+
+
+def _stems(text: str) -> set:
+    """Грубые основы значимых слов вопроса (первые 5 букв)."""
+    words = re.findall(r"[а-я]{4,}|[a-z_]{3,}", normalize_question(text).lower())
+    return {w[:5] for w in words if w[:4] not in _MONTH_STEMS} - _STOP_STEMS
+
+
+_EXAMPLE_STEMS = [_stems(question) for question, _ in EXAMPLES]
+
+
+def select_examples(question: str, limit: int = LLM_FEW_SHOT) -> list:
+    """
+    Выбирает примеры, ближайшие к вопросу по общим словам.
+
+    Примеры без общих слов не берутся; если похожих нет совсем, берется
+    первый пример, чтобы модель видела формат ответа.
+    """
+    stems = _stems(question)
+    scored = [
+        (len(stems & example_stems), index)
+        for index, example_stems in enumerate(_EXAMPLE_STEMS)
+    ]
+    best = sorted((item for item in scored if item[0] > 0), key=lambda item: (-item[0], item[1]))
+    indexes = sorted(index for _, index in best[:limit]) or [0]
+    return [EXAMPLES[index] for index in indexes[:max(limit, 1)]]
+
+
+def build_rewrite_prompt(question: str, sql_query: str, reason: str) -> str:
+    """Просьба переписать отклоненный запрос дешевле, с вопросом и исходным SQL."""
+    return (
+        f"{build_user_prompt(question)} {sql_query}\n\n"
+        f"Этот запрос отклонен: {reason}. Напиши более дешевый запрос с тем же ответом: "
+        "без коррелированных подзапросов и соединений без условия, с фильтрами по колонкам дат.\nSQL:"
+    )
+
+
+def build_user_prompt(question: str) -> str:
+    """Переменная часть промпта: подобранные примеры и сам вопрос."""
+    lines = []
+    for example_question, example_sql in select_examples(question):
+        lines.append(f"Вопрос: {example_question}\nSQL: {example_sql}\n")
+    lines.append(f"Вопрос: {question}\nSQL:")
+    return "\n".join(lines)
@@ -0,0 +1,234 @@
+"""Журнал выполнения запросов: статистика по отпечаткам и планы медленных запросов."""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+from bot.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Записывать статистику запросов в query_stats / slow_queries
+DB_QUERY_LOG = os.getenv("DB_QUERY_LOG", "1") != "0"
+
+# Запрос дольше этого порога (мс) считается медленным, и для него снимается EXPLAIN ANALYZE
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 1000))
+
+# Не чаще одного EXPLAIN ANALYZE на отпечаток за этот интервал (секунды): он выполняет запрос заново
+DB_SLOW_EXPLAIN_INTERVAL = float(os.getenv("DB_SLOW_EXPLAIN_INTERVAL", 3600))
+
+# Как часто накопленная статистика пишется в query_stats (секунды)
+DB_QUERY_STATS_FLUSH = float(os.getenv("DB_QUERY_STATS_FLUSH", 30))
+
+# Для скольких последних форм запросов помнить, что оценка плана и EXPLAIN уже сняты:
+# SQL от LLM дает неограниченное число форм
+DB_QUERY_LOG_SHAPES = int(os.getenv("DB_QUERY_LOG_SHAPES", 10000))
+
+FLUSH_SQL = """
+    INSERT INTO query_stats (
+        fingerprint, query, calls, total_ms, max_ms, slow_calls, failed_calls, last_error, last_seen
+    )
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, NOW())
+    ON CONFLICT (fingerprint) DO UPDATE SET
+        calls = query_stats.calls + EXCLUDED.calls,
+        total_ms = query_stats.total_ms + EXCLUDED.total_ms,
+        max_ms = GREATEST(query_stats.max_ms, EXCLUDED.max_ms),
+        slow_calls = query_stats.slow_calls + EXCLUDED.slow_calls,
+        failed_calls = query_stats.failed_calls + EXCLUDED.failed_calls,
+        last_error = COALESCE(EXCLUDED.last_error, query_stats.last_error),
+        last_seen = NOW()
+"""
+
+SLOW_QUERY_SQL = """
+    INSERT INTO slow_queries (fingerprint, query, params, duration_ms, execution_ms, plan, error)
+    VALUES ($1, $2, $3, $4, $5, $6::jsonb, $7)
+"""
+
+ESTIMATE_SQL = """
+    INSERT INTO query_stats (fingerprint, query, plan_rows, plan_cost)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (fingerprint) DO UPDATE SET
+        plan_rows = EXCLUDED.plan_rows,
+        plan_cost = EXCLUDED.plan_cost
+"""
+
+
+def fingerprint(shape: str) -> str:
+    """Отпечаток формы запроса (запрос с $1..$n вместо значений)."""
+    return hashlib.sha256(shape.encode("utf-8")).hexdigest()
+
+
+def max_plan_rows(plan: dict) -> float:
+    """Наибольшая оценка числа строк среди узлов плана (у агрегата сверху она всегда 1)."""
+    return max([plan.get("Plan Rows", 0)] + [max_plan_rows(child) for child in plan.get("Plans", [])])
+
+
+class QueryLog:
+    """
+    Собирает длительности запросов и пишет их в query_stats пачками.
+
+    Для каждой новой формы запроса один раз в фоне снимается оценка
+    планировщика (EXPLAIN без выполнения): сколько строк запрос ожидает
+    перебрать и его стоимость.
+    Если запрос выполнялся дольше DB_SLOW_QUERY_MS, в фоне снимается
+    EXPLAIN (ANALYZE, BUFFERS) - в read-only транзакции и с тем же
+    statement_timeout, что у самого запроса. Запросы, остановленные по
+    таймауту, отклоненные по стоимости или упавшие с ошибкой, учитываются
+    в failed_calls с причиной, а для них снимается обычный EXPLAIN: выполнять
+    их повторно бессмысленно. Планы сохраняются в slow_queries. Ответ
+    пользователю эти замеры не задерживают.
+    """
+
+    def __init__(
+        self,
+        database,
+        slow_ms: float = DB_SLOW_QUERY_MS,
+        statement_timeout: int = 0,
+        max_shapes: int = DB_QUERY_LOG_SHAPES,
+    ):
+        self.database = database
+        self.slow_ms = slow_ms
+        self.statement_timeout = statement_timeout
+        self._pending = {}
+        # Вытесненная форма при следующем вызове просто получит оценку заново
+        self._estimated = LRUCache(max_shapes)
+        self._last_explain = LRUCache(max_shapes)
+        self._tasks = set()
+        self._explain_slot: Optional[asyncio.Semaphore] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Запускает периодическую запись статистики."""
+        # Не больше одного EXPLAIN ANALYZE одновременно
+        self._explain_slot = asyncio.Semaphore(1)
+        if self._flusher is None:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def stop(self):
+        """Останавливает фоновые задачи и записывает накопленное."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.flush()
+
+    def record(self, query: str, args: tuple, shape: str, duration: float, error: Optional[str] = None):
+        """
+        Учитывает выполненный запрос (duration в секундах).
+
+        error - причина, по которой запрос не выполнился (timeout, cost,
+        read_only, error), или None для успешного запроса.
+        """
+        key = fingerprint(shape)
+        duration_ms = duration * 1000
+        slow = duration_ms >= self.slow_ms
+
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = self._pending[key] = {
+                "query": shape, "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0, "failed": 0, "error": None,
+            }
+        entry["calls"] += 1
+        entry["total_ms"] += duration_ms
+        entry["max_ms"] = max(entry["max_ms"], duration_ms)
+        entry["slow"] += slow
+        if error is not None:
+            entry["failed"] += 1
+            entry["error"] = error
+
+        if self._estimated.get(key) is None:
+            self._estimated.set(key, True)
+            self._spawn(self._estimate(key, shape, query, args))
+
+        if slow or error is not None:
+            now = time.monotonic()
+            last = self._last_explain.get(key)
+            if last is None or now - last >= DB_SLOW_EXPLAIN_INTERVAL:
+                self._last_explain.set(key, now)
+                if error is not None:
+                    logger.warning(f"Запрос не выполнен ({error}, {duration_ms:.0f} мс), снимаю план: {shape}")
+                    self._spawn(self._explain_failed(key, query, args, duration_ms, error))
+                else:
+                    logger.warning(f"Медленный запрос ({duration_ms:.0f} мс), снимаю план: {shape}")
+                    self._spawn(self._explain_analyze(key, query, args, duration_ms))
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _estimate(self, key: str, shape: str, query: str, args: tuple):
+        """Сохраняет оценку планировщика для новой формы запроса."""
+        try:
+            async with self.database.pools.read_pool().acquire() as conn:
+                plan = json.loads(await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *args))[0]["Plan"]
+            await self.database.pool.execute(ESTIMATE_SQL, key, shape, max_plan_rows(plan), plan["Total Cost"])
+        except Exception as e:
+            logger.debug(f"Не удалось получить оценку плана: {e}")
+
+    async def _explain_analyze(self, key: str, query: str, args: tuple, duration_ms: float):
+        """Снимает фактический план медленного запроса и сохраняет его в slow_queries."""
+        try:
+            async with self._explain_slot, self.database.pools.read_pool().acquire() as conn:
+                async with conn.transaction(readonly=True):
+                    # EXPLAIN ANALYZE выполняет запрос заново: не дольше, чем разрешено самому запросу
+                    if self.statement_timeout:
+                        await conn.execute(f"SET LOCAL statement_timeout = {self.statement_timeout:d}")
+                    result = await conn.fetchval(
+                        f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", *args
+                    )
+            explain = json.loads(result)[0]
+            await self._save_plan(key, query, args, duration_ms, explain)
+        except Exception as e:
+            logger.warning(f"Не удалось снять план медленного запроса: {e}")
+
+    async def _explain_failed(self, key: str, query: str, args: tuple, duration_ms: float, error: str):
+        """Сохраняет план (без выполнения) запроса, который не выполнился."""
+        try:
+            async with self.database.pools.read_pool().acquire() as conn:
+                result = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *args)
+            await self._save_plan(key, query, args, duration_ms, json.loads(result)[0], error)
+        except Exception as e:
+            # У запроса с ошибкой в SQL план обычно тоже не строится
+            logger.debug(f"Не удалось снять план невыполненного запроса: {e}")
+
+    async def _save_plan(
+        self, key: str, query: str, args: tuple, duration_ms: float, explain: dict, error: Optional[str] = None
+    ):
+        await self.database.pool.execute(
+            SLOW_QUERY_SQL,
+            key,
+            query,
+            json.dumps([str(arg) for arg in args], ensure_ascii=False) if args else None,
+            duration_ms,
+            explain.get("Execution Time"),
+            json.dumps(explain),
+            error,
+        )
+
+    async def flush(self):
+        """Пишет накопленную статистику в query_stats."""
+        if not self._pending or self.database.pool is None:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            async with self.database.pool.acquire() as conn:
+                await conn.executemany(
+                    FLUSH_SQL,
+                    [
+                        (key, e["query"], e["calls"], e["total_ms"], e["max_ms"], e["slow"], e["failed"], e["error"])
+                        for key, e in pending.items()
+                    ],
+                )
+        except Exception as e:
+            logger.warning(f"Не удалось записать статистику запросов: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(DB_QUERY_STATS_FLUSH)
+            await self.flush()
@@ -0,0 +1,180 @@
+"""Планировщик обработки вопросов: общий лимит, справедливая очередь по чатам, сброс нагрузки
+и объединение одинаковых вопросов из разных чатов."""
+import asyncio
+import contextvars
+import logging
+import os
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+# Сколько вопросов обрабатывается одновременно (LLM + SQL); должно быть меньше размера пула БД
+SCHEDULER_MAX_IN_FLIGHT = int(os.getenv("SCHEDULER_MAX_IN_FLIGHT", 8))
+
+# Сколько вопросов одного чата может ждать в очереди
+SCHEDULER_MAX_QUEUE_PER_CHAT = int(os.getenv("SCHEDULER_MAX_QUEUE_PER_CHAT", 3))
+
+# Сколько вопросов всего может ждать в очереди
+SCHEDULER_MAX_QUEUED = int(os.getenv("SCHEDULER_MAX_QUEUED", 100))
+
+
+class SchedulerBusy(Exception):
+    """Очередь переполнена, вопрос не принят."""
+
+
+class _Job:
+    """Вопрос в очереди: фабрика корутины и future с результатом."""
+
+    def __init__(self, key: tuple, factory: Callable[[], Awaitable], future: asyncio.Future):
+        self.key = key
+        self.factory = factory
+        self.future = future
+        # Контекст отправителя (трассировка вопроса): задача может стартовать из чужой задачи
+        self.context = contextvars.copy_context()
+
+
+class QueryScheduler:
+    """
+    Ограничивает число одновременно обрабатываемых вопросов.
+
+    У каждого чата своя очередь, и свободные слоты раздаются чатам по кругу,
+    поэтому один активный чат не может занять все подключения к БД и квоту
+    LLM. Повтор вопроса, который этот чат уже ждет, присоединяется к
+    ожидающему запросу. При переполнении очередей submit выбрасывает
+    SchedulerBusy, и бот сразу отвечает, что занят.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = SCHEDULER_MAX_IN_FLIGHT,
+        max_queue_per_chat: int = SCHEDULER_MAX_QUEUE_PER_CHAT,
+        max_queued: int = SCHEDULER_MAX_QUEUED,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue_per_chat = max_queue_per_chat
+        self.max_queued = max_queued
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self.coalesced = 0
+        self._queues = OrderedDict()
+        self._pending = {}
+
+    async def submit(self, chat_id: Hashable, key: Hashable, factory: Callable[[], Awaitable]):
+        """
+        Ставит вопрос в очередь чата и ждет результата.
+
+        Args:
+            chat_id: Идентификатор чата
+            key: Ключ вопроса (нормализованный текст) для объединения повторов
+            factory: Функция без аргументов, возвращающая корутину обработки
+
+        Raises:
+            SchedulerBusy: Очередь чата или общая очередь переполнена
+        """
+        job_key = (chat_id, key)
+        future = self._pending.get(job_key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        queue = self._queues.get(chat_id)
+        if self.queued >= self.max_queued or (queue and len(queue) >= self.max_queue_per_chat):
+            self.rejected += 1
+            raise SchedulerBusy()
+
+        future = asyncio.get_running_loop().create_future()
+        # Ошибку прочитают ожидающие; если все они отменены, не шумим в логах
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        if queue is None:
+            queue = self._queues[chat_id] = deque()
+        queue.append(_Job(job_key, factory, future))
+        self._pending[job_key] = future
+        self.queued += 1
+
+        self._dispatch()
+        return await asyncio.shield(future)
+
+    def _dispatch(self):
+        """Запускает вопросы из очередей чатов по кругу, пока есть свободные слоты."""
+        while self.in_flight < self.max_in_flight and self._queues:
+            chat_id, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            if queue:
+                self._queues.move_to_end(chat_id)
+            else:
+                del self._queues[chat_id]
+
+            self.queued -= 1
+            self.in_flight += 1
+            job.context.run(asyncio.get_running_loop().create_task, self._run(job))
+
+    async def _run(self, job: _Job):
+        """Выполняет вопрос и передает результат всем ожидающим."""
+        try:
+            result = await job.factory()
+        except Exception as e:
+            job.future.set_exception(e)
+        except BaseException:
+            # Задачу отменили (остановка бота): ожидающие получат CancelledError, а не повиснут
+            job.future.cancel()
+            raise
+        else:
+            job.future.set_result(result)
+        finally:
+            self.in_flight -= 1
+            self._pending.pop(job.key, None)
+            self._dispatch()
+
+    def stats(self) -> dict:
+        """Возвращает текущую загрузку и счетчики планировщика."""
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "chats_waiting": len(self._queues),
+            "rejected": self.rejected,
+            "coalesced": self.coalesced,
+        }
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные вызовы с одинаковым ключом.
+
+    Первый вызов запускает работу, остальные ждут его результат (или ошибку),
+    пока он не завершится. Отмена одного ожидающего не отменяет работу для
+    остальных.
+    """
+
+    def __init__(self):
+        self.shared = 0
+        self._calls = {}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable]):
+        """
+        Выполняет factory() или присоединяется к уже идущему вызову с тем же ключом.
+
+        Args:
+            key: Ключ вызова (нормализованный вопрос)
+            factory: Функция без аргументов, возвращающая корутину
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        """Убирает завершенный вызов, чтобы следующий вопрос считался заново."""
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Ошибку прочитают ожидающие; если все они отменены, не шумим в логах
+        task.cancelled() or task.exception()
+
+    def stats(self) -> dict:
+        """Возвращает число идущих вызовов и число присоединившихся к ним."""
+        return {"in_flight": len(self._calls), "shared": self.shared}
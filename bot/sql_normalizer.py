@@ -0,0 +1,184 @@
+"""Нормализация SQL: вынос литералов в параметры и приведение запроса к форме для кэшей."""
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+
+# Слова, после которых строковый литерал является частью синтаксиса, а не значением
+# (DATE '2025-11-28', INTERVAL '1 day', AT TIME ZONE 'UTC')
+_TYPED_LITERAL_KEYWORDS = {"date", "time", "timestamp", "timestamptz", "interval", "zone"}
+
+# Ключевые слова, после которых числа не могут быть параметрами (ORDER BY 1, GROUP BY 1, 2)
+_POSITIONAL_KEYWORDS = {"by"}
+
+# Ключевые слова, завершающие список ORDER BY / GROUP BY
+_CLAUSE_KEYWORDS = {
+    "select", "from", "where", "having", "limit", "offset", "union",
+    "intersect", "except", "window", "on", "join", "and", "or",
+}
+
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_TIMESTAMP_RE = re.compile(
+    r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?(Z|[+-]\d{2}(?::?\d{2})?)?$"
+)
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_WORD_RE = re.compile(r"[A-Za-z_][\w$]*")
+_PARAM_RE = re.compile(r"\$\d+")
+
+_INT4_MAX = 2 ** 31 - 1
+
+
+def _string_param(value: str) -> tuple:
+    """Определяет Python-значение и тип параметра для строкового литерала."""
+    if _DATE_RE.match(value):
+        try:
+            return date.fromisoformat(value), "date"
+        except ValueError:
+            return value, "text"
+
+    match = _TIMESTAMP_RE.match(value)
+    if match:
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return value, "text"
+        return parsed, "timestamptz" if match.group(1) else "timestamp"
+
+    return value, "text"
+
+
+def _number_param(value: str) -> tuple:
+    """Определяет Python-значение и тип параметра для числового литерала."""
+    if re.fullmatch(r"\d+", value):
+        number = int(value)
+        return number, "int" if number <= _INT4_MAX else "bigint"
+    return Decimal(value), "numeric"
+
+
+def parameterize(query: str) -> Optional[tuple]:
+    """
+    Выносит литералы SQL запроса в параметры.
+
+    Строки и числа заменяются на $1..$n с явным приведением типа
+    (даты становятся date/timestamp, остальные строки - text), так что
+    запросы, отличающиеся только значениями (id креатора, даты, пороги),
+    получают одинаковый текст и переиспользуют подготовленный план.
+    Одинаковые литералы одного типа получают один параметр: иначе
+    DATE_TRUNC('day', created_at) в SELECT и в GROUP BY стали бы разными
+    выражениями, и PostgreSQL отклонил бы запрос.
+
+    Returns:
+        Кортеж (запрос с параметрами, список значений) или None, если запрос
+        уже содержит параметры или использует конструкции, которые
+        безопасно разобрать не получается (dollar-quoting, незакрытые строки)
+    """
+    if _PARAM_RE.search(query):
+        return None
+
+    parts = []
+    params = []
+    placeholders = {}
+    previous_word = None
+    in_positional_list = False
+    position = 0
+    length = len(query)
+
+    def placeholder(value, type_name: str) -> str:
+        key = (type_name, value)
+        if key not in placeholders:
+            params.append(value)
+            placeholders[key] = f"${len(params)}::{type_name}"
+        return placeholders[key]
+
+    while position < length:
+        char = query[position]
+
+        # Комментарии
+        if query.startswith("--", position):
+            end = query.find("\n", position)
+            position = length if end == -1 else end
+            continue
+        if query.startswith("/*", position):
+            end = query.find("*/", position + 2)
+            if end == -1:
+                return None
+            position = end + 2
+            continue
+
+        # Строковый литерал ('' внутри - экранированная кавычка)
+        if char == "'":
+            end = position + 1
+            chunks = []
+            while True:
+                quote = query.find("'", end)
+                if quote == -1:
+                    return None
+                chunks.append(query[end:quote])
+                if query.startswith("''", quote):
+                    chunks.append("'")
+                    end = quote + 2
+                    continue
+                break
+
+            literal = query[position:quote + 1]
+            # E'...', U&'...' и B'...' оставляем как есть
+            prefixed = bool(parts) and re.fullmatch(r"[EeBbXx]|&", parts[-1]) is not None
+            if previous_word in _TYPED_LITERAL_KEYWORDS or prefixed:
+                parts.append(literal)
+            else:
+                parts.append(placeholder(*_string_param("".join(chunks))))
+            previous_word = None
+            position = quote + 1
+            continue
+
+        # Идентификатор в двойных кавычках
+        if char == '"':
+            end = query.find('"', position + 1)
+            if end == -1:
+                return None
+            parts.append(query[position:end + 1])
+            previous_word = None
+            position = end + 1
+            continue
+
+        if char == "$":
+            return None
+
+        word = _WORD_RE.match(query, position)
+        if word:
+            lowered = word.group(0).lower()
+            if lowered in _POSITIONAL_KEYWORDS:
+                in_positional_list = True
+            elif lowered in _CLAUSE_KEYWORDS:
+                in_positional_list = False
+            parts.append(word.group(0))
+            previous_word = lowered
+            position = word.end()
+            continue
+
+        number = _NUMBER_RE.match(query, position)
+        if number:
+            preceding = query[position - 1] if position else ""
+            if in_positional_list or preceding == ".":
+                parts.append(number.group(0))
+            else:
+                parts.append(placeholder(*_number_param(number.group(0))))
+            previous_word = None
+            position = number.end()
+            continue
+
+        if char.isspace():
+            # Пробелы вне литералов схлопываются, чтобы форма запроса не зависела от форматирования
+            if parts and parts[-1] != " ":
+                parts.append(" ")
+        else:
+            previous_word = None
+            parts.append(char)
+        position += 1
+
+    return "".join(parts).strip().rstrip(";").strip(), params
+
+
+def normalize_sql(query: str) -> str:
+    """Приводит пробелы запроса к одному виду и убирает завершающую точку с запятой."""
+    return re.sub(r"\s+", " ", query).strip().rstrip(";").strip()
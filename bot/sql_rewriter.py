@@ -0,0 +1,109 @@
+"""Переписывание сгенерированного SQL в форму, которая может использовать индексы."""
+import re
+from datetime import date, timedelta
+
+from bot.templates import day_start
+
+# Ключевые слова SQL не могут быть именем колонки ("col NOT BETWEEN ...")
+_KEYWORDS = r"(?:NOT|AND|OR|BETWEEN|WHERE|ON|WHEN|THEN|ELSE|CASE|IS|IN|LIKE|SELECT|HAVING)\b"
+_COLUMN = rf"(?!{_KEYWORDS})([A-Za-z_]\w*(?:\.[A-Za-z_]\w*)?)"
+
+# DATE(col), DATE_TRUNC('day', col), col::date
+_DAY_OF_COLUMN = (
+    rf"(?:DATE\s*\(\s*{_COLUMN}\s*\)"
+    rf"|DATE_TRUNC\s*\(\s*'day'\s*,\s*{_COLUMN}\s*\)"
+    rf"|{_COLUMN}\s*::\s*date)"
+)
+
+# DATE('2025-11-28'), DATE '2025-11-28', '2025-11-28'::date, '2025-11-28'
+_DAY_LITERAL = r"(?:DATE\s*\(\s*'(\d{4}-\d{2}-\d{2})'\s*\)|DATE\s+'(\d{4}-\d{2}-\d{2})'|'(\d{4}-\d{2}-\d{2})'(?:\s*::\s*date)?)"
+# То же, но только с явным приведением к date: DATE('2025-11-28'), DATE '2025-11-28', '2025-11-28'::date
+_DATE_CAST_LITERAL = r"(?:DATE\s*\(\s*'(\d{4}-\d{2}-\d{2})'\s*\)|DATE\s+'(\d{4}-\d{2}-\d{2})'|'(\d{4}-\d{2}-\d{2})'\s*::\s*date)"
+
+_COMPARISON_RE = re.compile(
+    rf"{_DAY_OF_COLUMN}\s*(=|>=|<=|>|<)\s*{_DAY_LITERAL}", re.IGNORECASE
+)
+_DAY_BETWEEN_RE = re.compile(
+    rf"{_DAY_OF_COLUMN}\s+(NOT\s+)?BETWEEN\s+{_DAY_LITERAL}\s+AND\s+{_DAY_LITERAL}", re.IGNORECASE
+)
+# col BETWEEN DATE('a') AND DATE('b'): по смыслу вопроса ("с 1 по 5 ноября включительно")
+# день b должен входить целиком, а BETWEEN отрезает его на полуночи. Границы без приведения
+# к date ('a' AND 'b') не трогаем: такой запрос уже использует индекс, и его смысл задан явно
+_COLUMN_BETWEEN_RE = re.compile(
+    rf"(?<![\w.]){_COLUMN}\s+(NOT\s+)?BETWEEN\s+{_DATE_CAST_LITERAL}\s+AND\s+{_DATE_CAST_LITERAL}",
+    re.IGNORECASE,
+)
+
+
+def _first(*values):
+    """Возвращает первое непустое значение из групп альтернатив регулярного выражения."""
+    return next(value for value in values if value)
+
+
+def _bound(value: date) -> str:
+    """Начало дня в REPORT_TIMEZONE как литерал TIMESTAMP WITH TIME ZONE."""
+    return f"'{day_start(value).isoformat()}'"
+
+
+def _range(column: str, first: date, last: date) -> str:
+    """Полуинтервал, покрывающий дни с first по last включительно."""
+    return f"({column} >= {_bound(first)} AND {column} < {_bound(last + timedelta(days=1))})"
+
+
+def _outside(column: str, first: date, last: date) -> str:
+    """Значения col вне дней с first по last (NOT BETWEEN)."""
+    return f"({column} < {_bound(first)} OR {column} >= {_bound(last + timedelta(days=1))})"
+
+
+def _replace_comparison(match) -> str:
+    """DATE(col) <оператор> DATE('...') -> сравнение col с границей суток."""
+    column = _first(*match.group(1, 2, 3))
+    operator = match.group(4)
+    value = date.fromisoformat(_first(*match.group(5, 6, 7)))
+    next_day = value + timedelta(days=1)
+
+    if operator == "=":
+        return _range(column, value, value)
+    if operator == ">=":
+        return f"{column} >= {_bound(value)}"
+    if operator == ">":
+        return f"{column} >= {_bound(next_day)}"
+    if operator == "<=":
+        return f"{column} < {_bound(next_day)}"
+    return f"{column} < {_bound(value)}"
+
+
+def _replace_day_between(match) -> str:
+    """DATE(col) [NOT] BETWEEN DATE('a') AND DATE('b') -> полуинтервал по col (или его дополнение)."""
+    column = _first(*match.group(1, 2, 3))
+    first = date.fromisoformat(_first(*match.group(5, 6, 7)))
+    last = date.fromisoformat(_first(*match.group(8, 9, 10)))
+    return (_outside if match.group(4) else _range)(column, first, last)
+
+
+def _replace_column_between(match) -> str:
+    """col [NOT] BETWEEN DATE('a') AND DATE('b') -> полуинтервал, включающий весь день b (или его дополнение)."""
+    column = match.group(1)
+    first = date.fromisoformat(_first(*match.group(3, 4, 5)))
+    last = date.fromisoformat(_first(*match.group(6, 7, 8)))
+    return (_outside if match.group(2) else _range)(column, first, last)
+
+
+def rewrite_query(query: str) -> str:
+    """
+    Переписывает фильтры по дням в полуинтервалы по самой колонке.
+
+    DATE(created_at) = DATE('2025-11-28') не может использовать индекс по
+    created_at, поэтому превращается в
+    (created_at >= '2025-11-28T00:00:00+00:00' AND created_at < '2025-11-29T00:00:00+00:00').
+    Границы суток считаются в REPORT_TIMEZONE - том же часовом поясе, что
+    установлен для сессий пула, поэтому результат не меняется.
+    Некорректные даты оставляют запрос как есть.
+    """
+    try:
+        query = _DAY_BETWEEN_RE.sub(_replace_day_between, query)
+        query = _COMPARISON_RE.sub(_replace_comparison, query)
+        query = _COLUMN_BETWEEN_RE.sub(_replace_column_between, query)
+    except ValueError:
+        return query
+    return query
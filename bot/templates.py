@@ -0,0 +1,236 @@
+"""Шаблоны типовых вопросов: распознавание без LLM и готовый параметризованный SQL."""
+import os
+import re
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from bot.cache import normalize_question
+
+# Часовой пояс, в котором понимаются даты из вопросов ("28 ноября 2025")
+REPORT_TIMEZONE = ZoneInfo(os.getenv("REPORT_TIMEZONE", "UTC"))
+
+MONTHS = {
+    "января": 1,
+    "февраля": 2,
+    "марта": 3,
+    "апреля": 4,
+    "мая": 5,
+    "июня": 6,
+    "июля": 7,
+    "августа": 8,
+    "сентября": 9,
+    "октября": 10,
+    "ноября": 11,
+    "декабря": 12,
+}
+
+# Поля статистики по корню слова в вопросе
+METRICS = {
+    "просмотр": "views_count",
+    "лайк": "likes_count",
+    "комментар": "comments_count",
+    "жалоб": "reports_count",
+}
+
+_MONTH = "(" + "|".join(MONTHS) + ")"
+_DATE = rf"(\d{{1,2}}) {_MONTH}(?: (\d{{4}}))?"
+_METRIC = "(" + "|".join(METRICS) + r")\w*"
+
+# "с 1 ноября 2025 по 5 ноября 2025", "с 1 по 5 ноября 2025"
+_RANGE = rf"с (\d{{1,2}})(?: {_MONTH})?(?: (\d{{4}}))? (?:по|до) {_DATE}"
+_RANGE_RE = re.compile(rf"\b{_RANGE}")
+# Диапазон без других условий: все, что после него, шаблон не учитывает
+_RANGE_ONLY_RE = re.compile(rf"^{_RANGE}(?: г| года)?(?: включительно)?$")
+
+_TOTAL_RE = re.compile(
+    r"^сколько (?:всего )?видео(?: всего)?(?: есть)?(?: всего)?(?: в (?:системе|базе(?: данных)?))?$"
+)
+_CREATOR_RE = re.compile(
+    r"^сколько (?:всего )?видео у креатора (?:с )?(?:(?i:id) |айди |идентификатором )?([\w\-]+) "
+    r"(?:вышло|опубликовано|было опубликовано|выпущено) "
+)
+_THRESHOLD_RE = re.compile(
+    rf"^сколько (?:всего )?видео (?:набрало|набрали|имеет|имеют|получило|получили) "
+    rf"(больше|более|меньше|менее) ([\d ]+?) {_METRIC}(?: за (?:все|всю) (?:время|историю))?$"
+)
+_DELTA_SUM_RE = re.compile(
+    rf"^на сколько {_METRIC} (?:в сумме |суммарно |всего )?(?:выросли|выросло|увеличились|прибавили) "
+    rf"(?:все )?видео {_DATE}$"
+)
+_DISTINCT_RE = re.compile(
+    rf"^сколько (?:разных |уникальных )?видео (?:получали|получило|получили) новые {_METRIC} {_DATE}$"
+)
+
+
+# SQL шаблонов; {column} и {operator} подставляются из METRICS и вопроса, значения - параметрами
+_TOTAL_SQL = "SELECT COUNT(*) FROM videos"
+_CREATOR_SQL = (
+    "SELECT COUNT(*) FROM videos "
+    "WHERE creator_id = $1 AND video_created_at >= $2 AND video_created_at < $3"
+)
+_CREATOR_ROLLUP_SQL = (
+    "SELECT COALESCE(SUM(videos_count), 0) FROM creator_daily_videos "
+    "WHERE creator_id = $1 AND day >= $2 AND day <= $3"
+)
+# Счетчики INTEGER, а порог из вопроса может быть больше 2^31: параметр передается как BIGINT
+_THRESHOLD_SQL = "SELECT COUNT(*) FROM videos WHERE {column} {operator} $1::bigint"
+_BIGINT_MAX = 2 ** 63 - 1
+_DELTA_SUM_SQL = (
+    "SELECT COALESCE(SUM({column}), 0) FROM video_snapshots "
+    "WHERE created_at >= $1 AND created_at < $2"
+)
+_DISTINCT_SQL = (
+    "SELECT COUNT(DISTINCT video_id) FROM video_snapshots "
+    "WHERE created_at >= $1 AND created_at < $2 AND {column} > 0"
+)
+_DAY_ROLLUP_SQL = "SELECT COALESCE(SUM({column}), 0) FROM daily_snapshot_stats WHERE day = $1"
+
+
+def parse_russian_date(day: str, month: str, year: Optional[str]) -> Optional[date]:
+    """Собирает дату из частей вида "28", "ноября", "2025"."""
+    if year is None:
+        return None
+    try:
+        return date(int(year), MONTHS[month], int(day))
+    except (KeyError, ValueError):
+        return None
+
+
+def day_start(value: date) -> datetime:
+    """Начало суток в REPORT_TIMEZONE."""
+    return datetime.combine(value, time.min, tzinfo=REPORT_TIMEZONE)
+
+
+def day_bounds(first: date, last: date) -> tuple:
+    """Полуинтервал [начало first, начало дня после last) в REPORT_TIMEZONE."""
+    return day_start(first), day_start(last + timedelta(days=1))
+
+
+def parse_date_range(text: str, whole: bool = False) -> Optional[tuple]:
+    """
+    Находит в нормализованном вопросе диапазон дат "с ... по ...".
+
+    Недостающие месяц и год у начала диапазона берутся из его конца
+    ("с 1 по 5 ноября 2025"). При whole=True текст должен состоять только
+    из диапазона (допускается "включительно").
+    """
+    match = _RANGE_ONLY_RE.match(text) if whole else _RANGE_RE.search(text)
+    if not match:
+        return None
+
+    first_day, first_month, first_year, last_day, last_month, last_year = match.groups()
+    last = parse_russian_date(last_day, last_month, last_year)
+    if last is None:
+        return None
+    first = parse_russian_date(first_day, first_month or last_month, first_year or last_year)
+    if first is None or first > last:
+        return None
+    return first, last
+
+
+def _metric_column(word: str, prefix: str = "") -> str:
+    """Возвращает имя колонки по корню слова ("просмотр" -> views_count)."""
+    return prefix + METRICS[word]
+
+
+def template_statements() -> list:
+    """
+    Все варианты SQL, которые могут вернуть шаблоны, с примером параметров.
+
+    Пример - пустой день в прошлом: по нему запрос выполняется быстро и
+    попадает в кэш подготовленных запросов подключения (см. Database).
+    """
+    sample_day = date(2000, 1, 1)
+    sample_bounds = list(day_bounds(sample_day, sample_day))
+    statements = [
+        (_TOTAL_SQL, []),
+        (_CREATOR_SQL, ["", *sample_bounds]),
+        (_CREATOR_ROLLUP_SQL, ["", sample_day, sample_day]),
+    ]
+    for column in METRICS.values():
+        statements += [
+            (_THRESHOLD_SQL.format(column=column, operator=operator), [0]) for operator in (">", "<")
+        ]
+        statements += [
+            (_DELTA_SUM_SQL.format(column="delta_" + column), sample_bounds),
+            (_DISTINCT_SQL.format(column="delta_" + column), sample_bounds),
+            (_DAY_ROLLUP_SQL.format(column="delta_" + column), [sample_day]),
+            (_DAY_ROLLUP_SQL.format(column="videos_with_new_" + column.replace("_count", "")), [sample_day]),
+        ]
+    return statements
+
+
+def _original_token(question: str, token: str) -> str:
+    """Написание слова из нормализованного вопроса в исходном вопросе (для идентификаторов)."""
+    # Замена "ё" не меняет длину строки, поэтому позиции совпадают с исходным текстом
+    text = question.replace("ё", "е").replace("Ё", "Е")
+    match = re.search(rf"(?<![\w\-]){re.escape(token)}(?![\w\-])", text, re.IGNORECASE)
+    return question[match.start():match.end()] if match else token
+
+
+def match_template(question: str, use_rollups: bool = False) -> Optional[tuple]:
+    """
+    Пытается сопоставить вопрос с одним из типовых шаблонов.
+
+    Args:
+        question: Вопрос пользователя
+        use_rollups: Отвечать по таблицам-агрегатам (daily_snapshot_stats,
+            creator_daily_videos), если они посчитаны в REPORT_TIMEZONE
+
+    Returns:
+        Кортеж (SQL с параметрами $1..$n, список параметров) или None,
+        если вопрос не похож ни на один шаблон
+    """
+    text = normalize_question(question)
+
+    if _TOTAL_RE.match(text):
+        return _TOTAL_SQL, []
+
+    match = _CREATOR_RE.match(text)
+    if match:
+        # Вопрос с дополнительными условиями ("и набрало больше ...") шаблон не покрывает
+        date_range = parse_date_range(text[match.end():], whole=True)
+        creator_id = _original_token(question, match.group(1))
+        if date_range and use_rollups:
+            return _CREATOR_ROLLUP_SQL, [creator_id, *date_range]
+        if date_range:
+            start, end = day_bounds(*date_range)
+            return _CREATOR_SQL, [creator_id, start, end]
+        return None
+
+    match = _THRESHOLD_RE.match(text)
+    if match:
+        direction, number, metric = match.groups()
+        operator = ">" if direction in ("больше", "более") else "<"
+        return (
+            _THRESHOLD_SQL.format(column=_metric_column(metric), operator=operator),
+            # Больше BIGINT порог не бывает осмысленным, ответ от этого не меняется
+            [min(int(number.replace(" ", "")), _BIGINT_MAX)],
+        )
+
+    match = _DELTA_SUM_RE.match(text)
+    if match:
+        metric, day, month, year = match.groups()
+        value = parse_russian_date(day, month, year)
+        if value is None:
+            return None
+        column = _metric_column(metric, "delta_")
+        if use_rollups:
+            return _DAY_ROLLUP_SQL.format(column=column), [value]
+        start, end = day_bounds(value, value)
+        return _DELTA_SUM_SQL.format(column=column), [start, end]
+
+    match = _DISTINCT_RE.match(text)
+    if match:
+        metric, day, month, year = match.groups()
+        value = parse_russian_date(day, month, year)
+        if value is None:
+            return None
+        if use_rollups:
+            column = "videos_with_new_" + METRICS[metric].replace("_count", "")
+            return _DAY_ROLLUP_SQL.format(column=column), [value]
+        start, end = day_bounds(value, value)
+        return _DISTINCT_SQL.format(column=_metric_column(metric, "delta_")), [start, end]
+
+    return None
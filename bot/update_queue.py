@@ -0,0 +1,240 @@
+"""Очередь обновлений Telegram в PostgreSQL: прием (ingress) отдельно от обработки (worker)."""
+import asyncio
+import json
+import logging
+import os
+import secrets
+import socket
+from typing import Optional
+
+import asyncpg
+from aiohttp import web
+
+from bot.bot import (
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_PATH,
+    WEBHOOK_URL,
+    bot,
+    dp,
+    prepare,
+    shutdown,
+    webhook_secret,
+)
+from bot.database import db, parse_database_url
+
+logger = logging.getLogger(__name__)
+
+# Канал NOTIFY, который триггер update_queue_notify шлет после вставки
+UPDATE_QUEUE_CHANNEL = "update_queue"
+
+# Сколько обновлений один процесс-обработчик ведет одновременно (меньше размера пула БД)
+UPDATE_WORKER_CONCURRENCY = int(os.getenv("UPDATE_WORKER_CONCURRENCY", 8))
+
+# На сколько секунд обработчик захватывает обновление; по истечении его заберет другой
+UPDATE_LEASE_SECONDS = int(os.getenv("UPDATE_LEASE_SECONDS", 120))
+
+# Сколько попыток дается обновлению, прежде чем оно будет выброшено из очереди
+UPDATE_MAX_ATTEMPTS = int(os.getenv("UPDATE_MAX_ATTEMPTS", 3))
+
+# Как часто проверять очередь без NOTIFY (просроченные захваты, потерянные уведомления)
+UPDATE_POLL_INTERVAL = float(os.getenv("UPDATE_POLL_INTERVAL", 2))
+
+# Берем самое старое свободное обновление, у чата которого нет более ранних
+# обновлений в очереди: так чат обрабатывается строго по одному обновлению за раз
+# и ответы приходят в порядке вопросов
+CLAIM_SQL = """
+    UPDATE update_queue
+    SET locked_by = $1,
+        locked_until = NOW() + $2 * INTERVAL '1 second',
+        attempts = attempts + 1
+    WHERE id = (
+        SELECT q.id FROM update_queue q
+        WHERE (q.locked_until IS NULL OR q.locked_until < NOW())
+          AND NOT EXISTS (
+              SELECT 1 FROM update_queue p
+              WHERE p.chat_id = q.chat_id AND p.id < q.id
+          )
+        ORDER BY q.id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, payload, attempts
+"""
+
+
+def update_chat_id(update: dict) -> Optional[int]:
+    """Находит id чата в обновлении (message, edited_message, callback_query и т.д.)."""
+    for key, value in update.items():
+        if not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = value.get("from")
+        if user:
+            return user["id"]
+    return None
+
+
+async def enqueue_updates(pool: asyncpg.Pool, updates: list):
+    """Кладет обновления в очередь; повторная доставка того же update_id игнорируется."""
+    if not updates:
+        return
+    async with pool.acquire() as conn:
+        await conn.executemany(
+            """
+            INSERT INTO update_queue (update_id, chat_id, payload)
+            VALUES ($1, $2, $3::jsonb)
+            ON CONFLICT (update_id) DO NOTHING
+            """,
+            [(u["update_id"], update_chat_id(u), json.dumps(u)) for u in updates],
+        )
+
+
+class UpdateWorker:
+    """
+    Обработчик очереди: забирает обновления и передает их диспетчеру aiogram.
+
+    Обновление удаляется из очереди только после обработки; если процесс
+    упал, захват истекает через UPDATE_LEASE_SECONDS и обновление достается
+    другому обработчику. Новые обновления будят обработчик через LISTEN.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, concurrency: int = UPDATE_WORKER_CONCURRENCY):
+        self.pool = pool
+        self.concurrency = concurrency
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.processed = 0
+        self.failed = 0
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._listener: Optional[asyncpg.Connection] = None
+
+    async def run(self):
+        """Подписывается на очередь и обрабатывает обновления до вызова stop()."""
+        try:
+            params = parse_database_url(os.getenv("DATABASE_URL"))
+            self._listener = await asyncpg.connect(**params)
+            await self._listener.add_listener(UPDATE_QUEUE_CHANNEL, self._on_notify)
+        except Exception as e:
+            logger.warning(f"Не удалось подписаться на очередь, опрос раз в {UPDATE_POLL_INTERVAL:g} с: {e}")
+
+        logger.info(f"Обработчик очереди {self.name} запущен ({self.concurrency} потоков)")
+        try:
+            await asyncio.gather(*(self._consume() for _ in range(self.concurrency)))
+        finally:
+            if self._listener is not None:
+                await self._listener.close()
+                self._listener = None
+
+    def stop(self):
+        """Просит обработчик завершиться после текущих обновлений."""
+        self._stopping = True
+        self._wakeup.set()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self._wakeup.set()
+
+    async def _consume(self):
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                item = await self.pool.fetchrow(CLAIM_SQL, self.name, UPDATE_LEASE_SECONDS)
+            except Exception as e:
+                logger.error(f"Ошибка чтения очереди обновлений: {e}")
+                item = None
+
+            if item is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), UPDATE_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._process(item)
+
+    async def _process(self, item):
+        """Обрабатывает обновление и удаляет его из очереди (или возвращает для повтора)."""
+        try:
+            await dp.feed_raw_update(bot, json.loads(item["payload"]))
+        except Exception as e:
+            self.failed += 1
+            if item["attempts"] < UPDATE_MAX_ATTEMPTS:
+                logger.error(f"Ошибка обработки обновления {item['id']}, будет повтор: {e}", exc_info=True)
+                await self.pool.execute(
+                    "UPDATE update_queue SET locked_by = NULL, locked_until = NULL WHERE id = $1",
+                    item["id"],
+                )
+                return
+            logger.error(f"Обновление {item['id']} не обработано за {item['attempts']} попыток, пропускаю: {e}")
+        else:
+            self.processed += 1
+
+        await self.pool.execute("DELETE FROM update_queue WHERE id = $1", item["id"])
+
+
+async def run_ingress_polling():
+    """Получает обновления long polling и кладет их в очередь, не обрабатывая."""
+    await db.connect_primary()
+    offset = None
+    try:
+        await bot.delete_webhook()
+        logger.info("Прием обновлений через polling в очередь")
+        while True:
+            try:
+                updates = await bot.get_updates(
+                    offset=offset, timeout=30, allowed_updates=dp.resolve_used_update_types()
+                )
+            except Exception as e:
+                logger.error(f"Ошибка получения обновлений: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            # offset подтверждает обновления Telegram, поэтому двигаем его только после записи
+            await enqueue_updates(
+                db.pool, [u.model_dump(mode="json", exclude_none=True) for u in updates]
+            )
+            if updates:
+                offset = updates[-1].update_id + 1
+    finally:
+        await bot.session.close()
+        await db.disconnect()
+
+
+def setup_ingress_webhook(app: web.Application):
+    """Принимает обновления webhook на WEBHOOK_PATH и кладет их в очередь."""
+
+    async def handle(request: web.Request) -> web.Response:
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not secrets.compare_digest(token, webhook_secret()):
+            return web.Response(status=401, text="Unauthorized")
+        await enqueue_updates(db.pool, [await request.json()])
+        return web.json_response({})
+
+    async def on_startup(app: web.Application):
+        await db.connect_primary()
+        url = WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH
+        await bot.set_webhook(
+            url,
+            secret_token=webhook_secret(),
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info(f"Webhook установлен, обновления пишутся в очередь: {url}")
+
+    async def on_cleanup(app: web.Application):
+        await bot.session.close()
+        await db.disconnect()
+
+    app.router.add_post(WEBHOOK_PATH, handle)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+
+
+async def run_worker():
+    """Процесс-обработчик: подготавливает БД и обрабатывает очередь обновлений."""
+    await prepare()
+    try:
+        await UpdateWorker(db.pool).run()
+    finally:
+        await shutdown()
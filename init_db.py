@@ -1,11 +1,12 @@
 """Скрипт для инициализации базы данных (выполнение миграций)."""
 import asyncio
 import os
-from pathlib import Path
 
 import asyncpg
 from dotenv import load_dotenv
 
+from bot.database import apply_migrations
+
 load_dotenv()
 
 
@@ -52,14 +53,11 @@ async def init_database():
     )
 
     try:
-        migration_file = Path(__file__).parent / "migrations" / "001_create_tables.sql"
-        print(f"Выполнение миграции из {migration_file}...")
-
-        with open(migration_file, "r", encoding="utf-8") as f:
-            sql = f.read()
-            await conn.execute(sql)
-
-        print("Миграция выполнена успешно!")
+        applied = await apply_migrations(conn)
+        if applied:
+            print(f"Выполнены миграции: {', '.join(applied)}")
+        else:
+            print("Новых миграций нет, схема актуальна")
     finally:
         await conn.close()
 
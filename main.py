@@ -3,7 +3,10 @@ import logging
 import os
 from aiohttp import web
 
+from bot.bot import WEBHOOK_URL, setup_webhook
 from bot.bot import main as bot_main
+from bot.metrics import metrics_endpoint
+from bot.update_queue import run_ingress_polling, run_worker, setup_ingress_webhook
 from setup_db import load_json_to_db
 
 logging.basicConfig(
@@ -13,6 +16,10 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# all - прием и обработка в одном процессе; ingress - только прием обновлений в очередь
+# update_queue; worker - только обработка очереди (таких процессов может быть несколько)
+BOT_ROLE = os.getenv("BOT_ROLE", "all")
+
 
 async def health_check(request):
     """Health check endpoint для Render Web Service."""
@@ -20,10 +27,11 @@ async def health_check(request):
 
 
 async def load_data_endpoint(request):
-    """Endpoint для загрузки данных в БД (только для инициализации)."""
+    """Endpoint для загрузки данных в БД (?mode=full - полная перезагрузка)."""
     try:
-        logger.info("Начало загрузки данных через HTTP endpoint...")
-        await load_json_to_db()
+        mode = request.query.get("mode")
+        logger.info(f"Начало загрузки данных через HTTP endpoint (режим: {mode or 'по умолчанию'})...")
+        await load_json_to_db(mode=mode)
         logger.info("Данные загружены успешно")
         return web.json_response({
             "status": "success", 
@@ -44,6 +52,18 @@ async def init_bot(app):
     asyncio.create_task(bot_main())
 
 
+async def init_ingress(app):
+    """Запуск приема обновлений в очередь в фоне."""
+    logger.info("Запуск приема обновлений в очередь...")
+    asyncio.create_task(run_ingress_polling())
+
+
+async def init_worker(app):
+    """Запуск обработчика очереди обновлений в фоне."""
+    logger.info("Запуск обработчика очереди обновлений...")
+    asyncio.create_task(run_worker())
+
+
 async def cleanup_bot(app):
     """Очистка при остановке."""
     logger.info("Остановка сервиса...")
@@ -54,11 +74,22 @@ def create_app():
     app = web.Application()
     app.router.add_get("/", health_check)
     app.router.add_get("/health", health_check)
+    app.router.add_get("/metrics", metrics_endpoint)
     # Endpoint для загрузки данных (GET и POST для удобства)
     app.router.add_get("/load-data", load_data_endpoint)
     app.router.add_post("/load-data", load_data_endpoint)
     
-    app.on_startup.append(init_bot)
+    if BOT_ROLE == "worker":
+        app.on_startup.append(init_worker)
+    elif BOT_ROLE == "ingress" and WEBHOOK_URL:
+        setup_ingress_webhook(app)
+    elif BOT_ROLE == "ingress":
+        app.on_startup.append(init_ingress)
+    elif WEBHOOK_URL:
+        # Обновления приходят на этот же сервер, polling не нужен
+        setup_webhook(app)
+    else:
+        app.on_startup.append(init_bot)
     app.on_cleanup.append(cleanup_bot)
     
     return app
@@ -0,0 +1,6 @@
+-- Служебное состояние загрузчика (high-water mark инкрементальной синхронизации и т.п.)
+CREATE TABLE IF NOT EXISTS load_state (
+    key VARCHAR(64) PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,7 @@
+-- Пачки, уже записанные параллельным загрузчиком (для продолжения после сбоя)
+CREATE TABLE IF NOT EXISTS load_progress (
+    run_key VARCHAR(64) NOT NULL,
+    batch_no INTEGER NOT NULL,
+    loaded_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (run_key, batch_no)
+);
@@ -0,0 +1,11 @@
+-- Кэш преобразования вопрос -> SQL (чтобы повторные вопросы не ходили в LLM)
+CREATE TABLE IF NOT EXISTS sql_cache (
+    question_hash VARCHAR(64) PRIMARY KEY,
+    question TEXT NOT NULL,
+    sql_query TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    last_used_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_sql_cache_last_used_at ON sql_cache(last_used_at);
@@ -0,0 +1,11 @@
+-- Составные индексы под фильтры по дате замера и по креатору с датой публикации.
+-- Фильтры по дням переписываются в полуинтервалы created_at >= ... AND created_at < ...
+-- (см. bot/sql_rewriter.py), поэтому индекса по DATE(created_at) не нужно: для
+-- TIMESTAMP WITH TIME ZONE такое выражение зависит от часового пояса сессии и
+-- не может быть проиндексировано.
+CREATE INDEX IF NOT EXISTS idx_snapshots_created_at_video_id ON video_snapshots(created_at, video_id);
+CREATE INDEX IF NOT EXISTS idx_videos_creator_id_created_at ON videos(creator_id, video_created_at);
+
+-- Индексы, полностью покрытые составными
+DROP INDEX IF EXISTS idx_snapshots_created_at;
+DROP INDEX IF EXISTS idx_videos_creator_id;
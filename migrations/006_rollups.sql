@@ -0,0 +1,67 @@
+-- Предагрегированные таблицы, которые поддерживает загрузчик (setup_db.refresh_rollups).
+-- Дни считаются в часовом поясе, записанном в load_state (ключ rollup_timezone).
+
+-- Суммы приращений и число видео по дням замеров
+CREATE TABLE IF NOT EXISTS daily_snapshot_stats (
+    day DATE PRIMARY KEY,
+    delta_views_count BIGINT NOT NULL DEFAULT 0,
+    delta_likes_count BIGINT NOT NULL DEFAULT 0,
+    delta_comments_count BIGINT NOT NULL DEFAULT 0,
+    delta_reports_count BIGINT NOT NULL DEFAULT 0,
+    snapshots_count INTEGER NOT NULL DEFAULT 0,
+    videos_count INTEGER NOT NULL DEFAULT 0,
+    videos_with_new_views INTEGER NOT NULL DEFAULT 0,
+    videos_with_new_likes INTEGER NOT NULL DEFAULT 0,
+    videos_with_new_comments INTEGER NOT NULL DEFAULT 0,
+    videos_with_new_reports INTEGER NOT NULL DEFAULT 0
+);
+
+-- Число опубликованных видео по креаторам и дням публикации
+CREATE TABLE IF NOT EXISTS creator_daily_videos (
+    creator_id VARCHAR(255) NOT NULL,
+    day DATE NOT NULL,
+    videos_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (creator_id, day)
+);
+
+-- Первый и последний замер по каждому видео
+CREATE TABLE IF NOT EXISTS video_snapshot_bounds (
+    video_id UUID PRIMARY KEY REFERENCES videos(id) ON DELETE CASCADE,
+    first_snapshot_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    last_snapshot_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    snapshots_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- Первичное заполнение по уже загруженным данным (в UTC; загрузчик пересоберет
+-- таблицы, если REPORT_TIMEZONE отличается)
+INSERT INTO daily_snapshot_stats
+SELECT
+    (created_at AT TIME ZONE 'UTC')::date,
+    SUM(delta_views_count),
+    SUM(delta_likes_count),
+    SUM(delta_comments_count),
+    SUM(delta_reports_count),
+    COUNT(*),
+    COUNT(DISTINCT video_id),
+    COUNT(DISTINCT video_id) FILTER (WHERE delta_views_count > 0),
+    COUNT(DISTINCT video_id) FILTER (WHERE delta_likes_count > 0),
+    COUNT(DISTINCT video_id) FILTER (WHERE delta_comments_count > 0),
+    COUNT(DISTINCT video_id) FILTER (WHERE delta_reports_count > 0)
+FROM video_snapshots
+GROUP BY 1
+ON CONFLICT (day) DO NOTHING;
+
+INSERT INTO creator_daily_videos
+SELECT creator_id, (video_created_at AT TIME ZONE 'UTC')::date, COUNT(*)
+FROM videos
+GROUP BY 1, 2
+ON CONFLICT (creator_id, day) DO NOTHING;
+
+INSERT INTO video_snapshot_bounds
+SELECT video_id, MIN(created_at), MAX(created_at), COUNT(*)
+FROM video_snapshots
+GROUP BY video_id
+ON CONFLICT (video_id) DO NOTHING;
+
+INSERT INTO load_state (key, value) VALUES ('rollup_timezone', 'UTC')
+ON CONFLICT (key) DO NOTHING;
@@ -0,0 +1,59 @@
+-- Секционирование video_snapshots по месяцам (по created_at, границы месяцев в UTC).
+-- Первичный ключ секционированной таблицы обязан включать ключ секционирования,
+-- поэтому он становится (id, created_at). Новые секции создает загрузчик
+-- (setup_db.SnapshotPartitions); секция по умолчанию страхует от строк
+-- вне созданных месяцев.
+DO $$
+DECLARE
+    month_start TIMESTAMP;
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'video_snapshots'::regclass
+    ) THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE video_snapshots RENAME TO video_snapshots_unpartitioned;
+    ALTER TABLE video_snapshots_unpartitioned
+        RENAME CONSTRAINT video_snapshots_pkey TO video_snapshots_unpartitioned_pkey;
+
+    CREATE TABLE video_snapshots (
+        id VARCHAR(255) NOT NULL,
+        video_id UUID NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+        views_count INTEGER NOT NULL DEFAULT 0,
+        likes_count INTEGER NOT NULL DEFAULT 0,
+        comments_count INTEGER NOT NULL DEFAULT 0,
+        reports_count INTEGER NOT NULL DEFAULT 0,
+        delta_views_count INTEGER NOT NULL DEFAULT 0,
+        delta_likes_count INTEGER NOT NULL DEFAULT 0,
+        delta_comments_count INTEGER NOT NULL DEFAULT 0,
+        delta_reports_count INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE NOT NULL,
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+
+    CREATE TABLE video_snapshots_default PARTITION OF video_snapshots DEFAULT;
+
+    FOR month_start IN
+        SELECT generate_series(
+            date_trunc('month', MIN(created_at) AT TIME ZONE 'UTC'),
+            date_trunc('month', MAX(created_at) AT TIME ZONE 'UTC'),
+            INTERVAL '1 month'
+        )
+        FROM video_snapshots_unpartitioned
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF video_snapshots FOR VALUES FROM (%L) TO (%L)',
+            'video_snapshots_' || to_char(month_start, 'YYYY_MM'),
+            month_start::text || '+00',
+            (month_start + INTERVAL '1 month')::text || '+00'
+        );
+    END LOOP;
+
+    INSERT INTO video_snapshots SELECT * FROM video_snapshots_unpartitioned;
+    DROP TABLE video_snapshots_unpartitioned;
+
+    CREATE INDEX idx_snapshots_video_id ON video_snapshots(video_id);
+    CREATE INDEX idx_snapshots_created_at_video_id ON video_snapshots(created_at, video_id);
+END $$;
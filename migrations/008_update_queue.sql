@@ -0,0 +1,27 @@
+-- Очередь обновлений Telegram между приемником (ingress) и обработчиками (worker)
+CREATE TABLE IF NOT EXISTS update_queue (
+    id BIGSERIAL PRIMARY KEY,
+    update_id BIGINT NOT NULL UNIQUE,
+    chat_id BIGINT,
+    payload JSONB NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    locked_by VARCHAR(255),
+    locked_until TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- Поиск более раннего обновления того же чата (порядок ответов внутри чата)
+CREATE INDEX IF NOT EXISTS idx_update_queue_chat_id ON update_queue(chat_id, id);
+
+-- Будим обработчиков после каждой вставки
+CREATE OR REPLACE FUNCTION notify_update_queue() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('update_queue', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_queue_notify ON update_queue;
+CREATE TRIGGER update_queue_notify
+    AFTER INSERT ON update_queue
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_update_queue();
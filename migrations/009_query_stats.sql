@@ -0,0 +1,29 @@
+-- Статистика выполнения запросов по отпечатку (форма запроса без значений литералов)
+CREATE TABLE IF NOT EXISTS query_stats (
+    fingerprint VARCHAR(64) PRIMARY KEY,
+    query TEXT NOT NULL,
+    calls BIGINT NOT NULL DEFAULT 0,
+    total_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+    max_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+    slow_calls BIGINT NOT NULL DEFAULT 0,
+    plan_rows DOUBLE PRECISION,
+    plan_cost DOUBLE PRECISION,
+    first_seen TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    last_seen TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_query_stats_total_ms ON query_stats(total_ms DESC);
+
+-- Планы медленных запросов (EXPLAIN ANALYZE, снимается в фоне)
+CREATE TABLE IF NOT EXISTS slow_queries (
+    id BIGSERIAL PRIMARY KEY,
+    fingerprint VARCHAR(64) NOT NULL,
+    query TEXT NOT NULL,
+    params TEXT,
+    duration_ms DOUBLE PRECISION NOT NULL,
+    execution_ms DOUBLE PRECISION,
+    plan JSONB,
+    captured_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_slow_queries_fingerprint ON slow_queries(fingerprint, captured_at);
@@ -0,0 +1,6 @@
+-- Запросы, остановленные по таймауту, отклоненные по стоимости или упавшие с ошибкой
+ALTER TABLE query_stats ADD COLUMN IF NOT EXISTS failed_calls BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE query_stats ADD COLUMN IF NOT EXISTS last_error VARCHAR(32);
+
+-- Для таких запросов в slow_queries сохраняется обычный EXPLAIN (без ANALYZE) и причина
+ALTER TABLE slow_queries ADD COLUMN IF NOT EXISTS error VARCHAR(32);
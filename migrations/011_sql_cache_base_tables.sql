@@ -0,0 +1,4 @@
+-- SQL от LLM больше не использует таблицы-агрегаты: они верны только в часовом
+-- поясе, в котором посчитаны, а кэш вопрос -> SQL от этого не зависит
+DELETE FROM sql_cache
+WHERE sql_query ~* '\m(daily_snapshot_stats|creator_daily_videos|video_snapshot_bounds)\M';
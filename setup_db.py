@@ -1,13 +1,19 @@
 import asyncio
+import hashlib
 import json
 import os
-from datetime import datetime
+import re
+import time
+from datetime import date, datetime, timezone
 from pathlib import Path
+from typing import Optional
 from urllib.parse import urlparse
 
 import asyncpg
 from dotenv import load_dotenv
 
+from bot.database import REPORT_TIMEZONE, apply_migrations, bump_data_version
+
 load_dotenv()
 
 
@@ -51,29 +57,870 @@ async def init_database():
     )
 
     try:
-        migration_file = Path(__file__).parent / "migrations" / "001_create_tables.sql"
-        print(f"Выполнение миграции из {migration_file}...")
+        applied = await apply_migrations(conn)
+        if applied:
+            print(f"Выполнены миграции: {', '.join(applied)}")
+        else:
+            print("Новых миграций нет, схема актуальна")
+    finally:
+        await conn.close()
+
+
+VIDEO_COLUMNS = (
+    "id", "creator_id", "video_created_at", "views_count",
+    "likes_count", "comments_count", "reports_count",
+    "created_at", "updated_at",
+)
+
+VIDEO_UPDATED_AT = VIDEO_COLUMNS.index("updated_at")
+
+SNAPSHOT_COLUMNS = (
+    "id", "video_id", "views_count", "likes_count",
+    "comments_count", "reports_count",
+    "delta_views_count", "delta_likes_count",
+    "delta_comments_count", "delta_reports_count",
+    "created_at", "updated_at",
+)
+
+SNAPSHOT_CREATED_AT = SNAPSHOT_COLUMNS.index("created_at")
+
+# Сколько строк снапшотов копируется за один COPY
+LOAD_BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", 20000))
+
+# Режим загрузки по умолчанию: incremental (только изменения) или full (полная перезагрузка)
+LOAD_MODE = os.getenv("LOAD_MODE", "incremental")
+
+# Количество параллельных подключений загрузчика (1 - одна транзакция на всю загрузку)
+LOAD_WORKERS = int(os.getenv("LOAD_WORKERS", 1))
+
+# Ключ high-water mark в таблице load_state: максимальный updated_at загруженных видео
+HIGH_WATER_MARK_KEY = "videos_updated_at"
+
+# Сколько последних месяцев снапшотов держать в video_snapshots (0 - все);
+# более старые секции отсоединяются от таблицы после загрузки
+SNAPSHOT_RETENTION_MONTHS = int(os.getenv("SNAPSHOT_RETENTION_MONTHS", 0))
+
+# Ключ advisory-блокировки создания секций video_snapshots
+PARTITIONS_LOCK_KEY = 7_302_013
+
+# Сколько создание секции ждет блокировки, прежде чем загрузка завершится ошибкой (секунды)
+PARTITION_LOCK_TIMEOUT = float(os.getenv("PARTITION_LOCK_TIMEOUT", 30))
+
+# Ключ load_state с часовым поясом, в котором посчитаны дни в таблицах-агрегатах
+ROLLUP_TIMEZONE_KEY = "rollup_timezone"
+
+# Размер блока, которым читается JSON-файл при потоковом разборе
+JSON_READ_CHUNK = 1024 * 1024
+
+_VIDEOS_KEY_RE = re.compile(r'"videos"\s*:\s*\[')
+_SEPARATOR_RE = re.compile(r"[\s,]*")
+
+
+def parse_timestamp(value: str) -> datetime:
+    """Преобразует ISO-строку из videos.json в datetime с часовым поясом."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def video_record(video: dict) -> tuple:
+    """Готовит строку таблицы videos в порядке VIDEO_COLUMNS."""
+    return (
+        video["id"],
+        video["creator_id"],
+        parse_timestamp(video["video_created_at"]),
+        video["views_count"],
+        video["likes_count"],
+        video["comments_count"],
+        video["reports_count"],
+        parse_timestamp(video["created_at"]),
+        parse_timestamp(video["updated_at"]),
+    )
+
+
+def snapshot_record(snapshot: dict) -> tuple:
+    """Готовит строку таблицы video_snapshots в порядке SNAPSHOT_COLUMNS."""
+    return (
+        snapshot["id"],
+        snapshot["video_id"],
+        snapshot["views_count"],
+        snapshot["likes_count"],
+        snapshot["comments_count"],
+        snapshot["reports_count"],
+        snapshot["delta_views_count"],
+        snapshot["delta_likes_count"],
+        snapshot["delta_comments_count"],
+        snapshot["delta_reports_count"],
+        parse_timestamp(snapshot["created_at"]),
+        parse_timestamp(snapshot["updated_at"]),
+    )
+
+
+def iter_videos(json_path, chunk_size: int = JSON_READ_CHUNK):
+    """
+    Потоково читает массив "videos" из JSON-файла, возвращая по одному видео.
+
+    Файл читается блоками, и в памяти держится только текущее видео
+    (вместе с его снапшотами), поэтому потребление памяти не зависит
+    от размера выгрузки.
+    """
+    decoder = json.JSONDecoder()
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        buffer = ""
+        # Позиция в buffer, с которой начинается неразобранный текст. Буфер не
+        # копируется после каждого видео: разобранная часть отбрасывается
+        # только при дочитывании следующего блока
+        position = 0
+        eof = False
+
+        def read_more() -> bool:
+            nonlocal buffer, position, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+                return False
+            buffer = buffer[position:] + chunk
+            position = 0
+            return True
+
+        # Ищем начало массива videos
+        while True:
+            match = _VIDEOS_KEY_RE.search(buffer, position)
+            if match:
+                position = match.end()
+                break
+            # Оставляем хвост на случай, если ключ разрезан границей блока
+            position = max(position, len(buffer) - 64)
+            if not read_more():
+                return
+
+        while True:
+            position = _SEPARATOR_RE.match(buffer, position).end()
+
+            if position == len(buffer):
+                if not read_more():
+                    raise ValueError(f"Неожиданный конец файла {json_path}")
+                continue
+            if buffer[position] == "]":
+                return
+
+            try:
+                video, position_after = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Объект не поместился в буфер целиком - дочитываем файл
+                if eof or not read_more():
+                    raise
+                continue
+
+            position = position_after
+            yield video
+
+
+def iter_batches(videos, batch_size: int):
+    """
+    Группирует видео в пачки записей для COPY.
+
+    Пачка закрывается, когда в ней набирается batch_size снапшотов,
+    и всегда содержит видео целиком вместе со всеми его снапшотами.
+
+    Yields:
+        Кортеж (строки videos, строки video_snapshots, число видео в пачке)
+    """
+    video_records = []
+    snapshot_records = []
+
+    for video in videos:
+        video_records.append(video_record(video))
+        for snapshot in video.get("snapshots", []):
+            snapshot_records.append(snapshot_record(snapshot))
+
+        if len(snapshot_records) >= batch_size or len(video_records) >= batch_size:
+            yield video_records, snapshot_records, len(video_records)
+            video_records, snapshot_records = [], []
+
+    if video_records or snapshot_records:
+        yield video_records, snapshot_records, len(video_records)
+
+
+def _affected_rows(status: str) -> int:
+    """Достает количество строк из статуса команды вида 'INSERT 0 42'."""
+    try:
+        return int(status.split()[-1])
+    except (ValueError, IndexError):
+        return 0
+
+
+async def create_staging_tables(conn):
+    """Создает временные таблицы, в которые данные попадают через COPY."""
+    await conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS videos_stage
+            (LIKE videos INCLUDING DEFAULTS);
+        CREATE TEMP TABLE IF NOT EXISTS video_snapshots_stage
+            (LIKE video_snapshots INCLUDING DEFAULTS);
+    """)
+
+
+def snapshot_months(snapshot_records: list) -> set:
+    """Возвращает месяцы (в UTC) замеров пачки как даты первого числа."""
+    months = set()
+    for record in snapshot_records:
+        created_at = record[SNAPSHOT_CREATED_AT].astimezone(timezone.utc)
+        months.add(date(created_at.year, created_at.month, 1))
+    return months
+
+
+def partition_name(month: date) -> str:
+    """Имя месячной секции video_snapshots."""
+    return f"video_snapshots_{month:%Y_%m}"
+
+
+def detached_name(name: str) -> str:
+    """Новое имя отсоединенной секции, чтобы секция того же месяца могла быть создана заново."""
+    return f"{name}_detached_{datetime.now(timezone.utc):%Y%m%d%H%M%S}"
+
+
+async def attached_partitions(conn) -> set:
+    """Имена секций, присоединенных к video_snapshots."""
+    rows = await conn.fetch("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'video_snapshots'::regclass
+    """)
+    return {row["relname"] for row in rows}
+
+
+class SnapshotPartitions:
+    """
+    Создает недостающие месячные секции video_snapshots на отдельном подключении.
+
+    Секция создается отдельной таблицей и присоединяется через ATTACH
+    PARTITION в собственной короткой транзакции, а не в транзакции
+    загрузки: CREATE TABLE ... PARTITION OF держит ACCESS EXCLUSIVE на
+    video_snapshots до фиксации, и запросы бота ждали бы всю загрузку, а
+    ATTACH достаточно SHARE UPDATE EXCLUSIVE. Созданная секция остается и
+    при откате загрузки, поэтому повторная загрузка в том же процессе не
+    отправит строки в секцию по умолчанию. Строки месяца, уже попавшие в
+    video_snapshots_default, переносятся в новую секцию. Таблица с именем
+    секции, отсоединенная раньше (detach_old_partitions), переименовывается.
+    Список присоединенных секций берется из pg_inherits для каждой загрузки.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._attached: Optional[set] = None
+        self._lock = asyncio.Lock()
+
+    async def ensure(self, months: set):
+        """Присоединяет секции для месяцев, которых еще нет."""
+        async with self._lock:
+            if self._attached is None:
+                self._attached = await attached_partitions(self.conn)
+            for month in sorted(months):
+                if partition_name(month) not in self._attached:
+                    await self._attach(month)
+                    self._attached.add(partition_name(month))
+
+    async def _attach(self, month: date):
+        name = partition_name(month)
+        next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        start = f"'{month.isoformat()} 00:00:00+00'"
+        end = f"'{next_month.isoformat()} 00:00:00+00'"
+
+        # Внутри транзакции загрузки (полная загрузка) SET LOCAL действовал бы до ее конца
+        in_load = self.conn.is_in_transaction()
+        async with self.conn.transaction():
+            await self.conn.execute("SELECT pg_advisory_xact_lock($1)", PARTITIONS_LOCK_KEY)
+            if not in_load:
+                await self.conn.execute(f"SET LOCAL lock_timeout = {int(PARTITION_LOCK_TIMEOUT * 1000):d}")
+            # Секцию мог создать другой загрузчик, пока мы ждали блокировку
+            if name in await attached_partitions(self.conn):
+                return
+            if await self.conn.fetchval("SELECT to_regclass($1) IS NOT NULL", name):
+                renamed = detached_name(name)
+                await self.conn.execute(f"ALTER TABLE {name} RENAME TO {renamed}")
+                print(f"Отсоединенная секция {name} переименована в {renamed}")
+
+            await self.conn.execute(f"""
+                CREATE TABLE {name} (LIKE video_snapshots INCLUDING DEFAULTS INCLUDING CONSTRAINTS);
+                -- С этим ограничением ATTACH не перепроверяет строки секции
+                ALTER TABLE {name} ADD CONSTRAINT {name}_bounds
+                    CHECK (created_at >= {start} AND created_at < {end});
+                WITH moved AS (
+                    DELETE FROM video_snapshots_default
+                    WHERE created_at >= {start} AND created_at < {end}
+                    RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved;
+                ALTER TABLE video_snapshots ATTACH PARTITION {name} FOR VALUES FROM ({start}) TO ({end});
+                ALTER TABLE {name} DROP CONSTRAINT {name}_bounds;
+            """)
+
+
+async def detach_old_partitions(conn, keep_months: int) -> list:
+    """
+    Отсоединяет секции video_snapshots старше keep_months последних месяцев.
+
+    Отсоединенные секции остаются обычными таблицами с суффиксом _detached_<время>:
+    их можно выгрузить (pg_dump) и удалить, а секция того же месяца при новых
+    данных создается заново. Агрегаты по снапшотам (daily_snapshot_stats,
+    video_snapshot_bounds) в той же транзакции пересчитываются по оставшимся
+    данным - см. forget_detached_snapshots.
+
+    Returns:
+        Новые имена отсоединенных секций
+    """
+    today = datetime.now(timezone.utc).date()
+    month_index = today.year * 12 + today.month - 1 - (keep_months - 1)
+    oldest_kept = date(month_index // 12, month_index % 12 + 1, 1)
+
+    rows = await conn.fetch("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'video_snapshots'::regclass
+          AND c.relname ~ '^video_snapshots_[0-9]{4}_[0-9]{2}$'
+    """)
+    old_partitions = sorted(
+        row["relname"] for row in rows if row["relname"] < partition_name(oldest_kept)
+    )
+    detached = []
+    if not old_partitions:
+        return detached
+    async with conn.transaction():
+        for name in old_partitions:
+            renamed = detached_name(name)
+            await conn.execute(f"ALTER TABLE video_snapshots DETACH PARTITION {name}")
+            await conn.execute(f"ALTER TABLE {name} RENAME TO {renamed}")
+            detached.append(renamed)
+        await forget_detached_snapshots(conn, datetime(oldest_kept.year, oldest_kept.month, 1, tzinfo=timezone.utc))
+        await bump_data_version(conn)
+    return detached
+
+
+async def forget_detached_snapshots(conn, cutoff: datetime):
+    """
+    Убирает из агрегатов снапшоты раньше cutoff, которых больше нет в video_snapshots.
+
+    Дни daily_snapshot_stats до дня cutoff (в REPORT_TIMEZONE) удаляются, а сам
+    этот день, если секция отрезала его часть, пересчитывается по оставшимся
+    снапшотам. Если агрегаты посчитаны в другом часовом поясе, дни не трогаются:
+    следующая загрузка все равно пересоберет их целиком. video_snapshot_bounds
+    пересчитывается для видео, чей первый замер был раньше cutoff; видео без
+    оставшихся замеров из нее пропадают. creator_daily_videos строится по videos
+    и от срока хранения снапшотов не зависит.
+    """
+    rollup_timezone = await conn.fetchval(
+        "SELECT value FROM load_state WHERE key = $1", ROLLUP_TIMEZONE_KEY
+    )
+    if rollup_timezone == REPORT_TIMEZONE:
+        boundary_day = await conn.fetchval("SELECT ($1::timestamptz AT TIME ZONE $2)::date", cutoff, REPORT_TIMEZONE)
+        await conn.execute("DELETE FROM daily_snapshot_stats WHERE day <= $1", boundary_day)
+        await conn.execute(
+            f"""
+            {DAILY_STATS_SELECT}
+            WHERE created_at < ($2::date + 1)::timestamp AT TIME ZONE $1
+            GROUP BY 1
+            """,
+            REPORT_TIMEZONE,
+            boundary_day,
+        )
+
+    await conn.execute(
+        f"""
+        WITH stale AS (
+            DELETE FROM video_snapshot_bounds WHERE first_snapshot_at < $1 RETURNING video_id
+        )
+        {VIDEO_BOUNDS_SELECT}
+        WHERE video_id IN (SELECT video_id FROM stale)
+        GROUP BY video_id
+        """,
+        cutoff,
+    )
+
+
+async def apply_retention(conn):
+    """Отсоединяет секции старше SNAPSHOT_RETENTION_MONTHS, если срок хранения задан."""
+    if SNAPSHOT_RETENTION_MONTHS <= 0:
+        return
+    detached = await detach_old_partitions(conn, SNAPSHOT_RETENTION_MONTHS)
+    if detached:
+        print(f"Отсоединены старые секции снапшотов: {', '.join(detached)}")
+
+
+DAILY_STATS_SELECT = """
+    INSERT INTO daily_snapshot_stats (
+        day, delta_views_count, delta_likes_count,
+        delta_comments_count, delta_reports_count,
+        snapshots_count, videos_count,
+        videos_with_new_views, videos_with_new_likes,
+        videos_with_new_comments, videos_with_new_reports
+    )
+    SELECT
+        (created_at AT TIME ZONE $1)::date AS day,
+        SUM(delta_views_count),
+        SUM(delta_likes_count),
+        SUM(delta_comments_count),
+        SUM(delta_reports_count),
+        COUNT(*),
+        COUNT(DISTINCT video_id),
+        COUNT(DISTINCT video_id) FILTER (WHERE delta_views_count > 0),
+        COUNT(DISTINCT video_id) FILTER (WHERE delta_likes_count > 0),
+        COUNT(DISTINCT video_id) FILTER (WHERE delta_comments_count > 0),
+        COUNT(DISTINCT video_id) FILTER (WHERE delta_reports_count > 0)
+    FROM video_snapshots
+"""
+
+CREATOR_DAILY_SELECT = """
+    INSERT INTO creator_daily_videos (creator_id, day, videos_count)
+    SELECT creator_id, (video_created_at AT TIME ZONE $1)::date, COUNT(*)
+    FROM videos
+"""
+
+VIDEO_BOUNDS_SELECT = """
+    INSERT INTO video_snapshot_bounds (video_id, first_snapshot_at, last_snapshot_at, snapshots_count)
+    SELECT video_id, MIN(created_at), MAX(created_at), COUNT(*)
+    FROM video_snapshots
+"""
+
+VIDEO_BOUNDS_UPSERT = """
+    ON CONFLICT (video_id) DO UPDATE
+    SET first_snapshot_at = EXCLUDED.first_snapshot_at,
+        last_snapshot_at = EXCLUDED.last_snapshot_at,
+        snapshots_count = EXCLUDED.snapshots_count
+"""
 
-        with open(migration_file, "r", encoding="utf-8") as f:
-            sql = f.read()
-            await conn.execute(sql)
 
-        print("Миграция выполнена успешно!")
+class RollupKeys:
+    """Дни и креаторы, агрегаты по которым нужно пересчитать после загрузки."""
+
+    def __init__(self):
+        self.days = set()
+        self.creators = set()
+
+
+async def copy_batch(
+    conn,
+    video_records: list,
+    snapshot_records: list,
+    upsert: bool = False,
+    rollup_keys: Optional[RollupKeys] = None,
+) -> tuple:
+    """
+    Загружает пачку строк через COPY и переносит ее в основные таблицы.
+
+    COPY не умеет ON CONFLICT, поэтому строки сначала попадают во временные
+    таблицы, а затем переносятся одним INSERT ... SELECT с ON CONFLICT.
+    Повторы одного id внутри пачки схлопываются (DISTINCT ON, берется версия
+    с наибольшим updated_at): ON CONFLICT DO UPDATE не может изменить одну
+    строку дважды. Видео переносятся раньше снапшотов, чтобы не нарушать
+    внешний ключ.
+
+    Args:
+        upsert: Обновлять уже существующие видео, если у новой версии больше updated_at
+        rollup_keys: Если передан, в него собираются затронутые дни и креаторы,
+            а video_snapshot_bounds обновляется для видео пачки сразу
+
+    Returns:
+        Количество реально вставленных видео и снапшотов
+    """
+    if video_records:
+        await conn.copy_records_to_table(
+            "videos_stage", records=video_records, columns=VIDEO_COLUMNS
+        )
+    if snapshot_records:
+        await conn.copy_records_to_table(
+            "video_snapshots_stage", records=snapshot_records, columns=SNAPSHOT_COLUMNS
+        )
+
+    if rollup_keys is not None:
+        # Креаторы до и после обновления: видео могло сменить креатора или дату публикации
+        rows = await conn.fetch("""
+            SELECT creator_id FROM videos_stage
+            UNION
+            SELECT v.creator_id FROM videos v JOIN videos_stage s ON s.id = v.id
+        """)
+        rollup_keys.creators.update(row["creator_id"] for row in rows)
+        rows = await conn.fetch(
+            "SELECT DISTINCT (created_at AT TIME ZONE $1)::date AS day FROM video_snapshots_stage",
+            REPORT_TIMEZONE,
+        )
+        rollup_keys.days.update(row["day"] for row in rows)
+
+    video_columns = ", ".join(VIDEO_COLUMNS)
+    snapshot_columns = ", ".join(SNAPSHOT_COLUMNS)
+    if upsert:
+        updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in VIDEO_COLUMNS[1:])
+        on_conflict = f"DO UPDATE SET {updates} WHERE videos.updated_at < EXCLUDED.updated_at"
+    else:
+        on_conflict = "DO NOTHING"
+    videos_status = await conn.execute(f"""
+        INSERT INTO videos ({video_columns})
+        SELECT DISTINCT ON (id) {video_columns} FROM videos_stage
+        ORDER BY id, updated_at DESC
+        ON CONFLICT (id) {on_conflict}
+    """)
+    snapshots_status = await conn.execute(f"""
+        INSERT INTO video_snapshots ({snapshot_columns})
+        SELECT DISTINCT ON (id, created_at) {snapshot_columns} FROM video_snapshots_stage
+        ORDER BY id, created_at, updated_at DESC
+        ON CONFLICT (id, created_at) DO NOTHING
+    """)
+    if rollup_keys is not None:
+        await conn.execute(f"""
+            {VIDEO_BOUNDS_SELECT}
+            WHERE video_id IN (SELECT DISTINCT video_id FROM video_snapshots_stage)
+            GROUP BY video_id
+            {VIDEO_BOUNDS_UPSERT}
+        """)
+    await conn.execute("TRUNCATE videos_stage, video_snapshots_stage")
+
+    return _affected_rows(videos_status), _affected_rows(snapshots_status)
+
+
+async def refresh_rollups(conn, rollup_keys: Optional[RollupKeys] = None):
+    """
+    Пересчитывает таблицы-агрегаты daily_snapshot_stats, creator_daily_videos
+    и video_snapshot_bounds.
+
+    Без rollup_keys (а также если агрегаты посчитаны в другом часовом поясе)
+    таблицы пересобираются целиком; иначе пересчитываются только затронутые
+    загрузкой дни и креаторы - время пересчета пропорционально новым данным.
+    video_snapshot_bounds в инкрементальном режиме обновляется в copy_batch.
+    """
+    rollup_timezone = await conn.fetchval(
+        "SELECT value FROM load_state WHERE key = $1", ROLLUP_TIMEZONE_KEY
+    )
+    if rollup_timezone != REPORT_TIMEZONE:
+        rollup_keys = None
+
+    if rollup_keys is None:
+        await conn.execute("TRUNCATE daily_snapshot_stats, creator_daily_videos, video_snapshot_bounds")
+        await conn.execute(f"{DAILY_STATS_SELECT} GROUP BY 1", REPORT_TIMEZONE)
+        await conn.execute(f"{CREATOR_DAILY_SELECT} GROUP BY 1, 2", REPORT_TIMEZONE)
+        await conn.execute(f"{VIDEO_BOUNDS_SELECT} GROUP BY video_id")
+        await conn.execute(
+            """
+            INSERT INTO load_state (key, value, updated_at) VALUES ($1, $2, NOW())
+            ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW()
+            """,
+            ROLLUP_TIMEZONE_KEY,
+            REPORT_TIMEZONE,
+        )
+        print("Таблицы-агрегаты пересобраны")
+        return
+
+    if rollup_keys.days:
+        days = sorted(rollup_keys.days)
+        await conn.execute("DELETE FROM daily_snapshot_stats WHERE day = ANY($1::date[])", days)
+        # Диапазон по created_at позволяет использовать индекс, точный отбор дней - второе условие
+        await conn.execute(
+            f"""
+            {DAILY_STATS_SELECT}
+            WHERE created_at >= ($2::date)::timestamp AT TIME ZONE $1
+              AND created_at < ($3::date + 1)::timestamp AT TIME ZONE $1
+              AND (created_at AT TIME ZONE $1)::date = ANY($4::date[])
+            GROUP BY 1
+            """,
+            REPORT_TIMEZONE,
+            days[0],
+            days[-1],
+            days,
+        )
+
+    if rollup_keys.creators:
+        creators = list(rollup_keys.creators)
+        await conn.execute("DELETE FROM creator_daily_videos WHERE creator_id = ANY($1::varchar[])", creators)
+        await conn.execute(
+            f"{CREATOR_DAILY_SELECT} WHERE creator_id = ANY($2::varchar[]) GROUP BY 1, 2",
+            REPORT_TIMEZONE,
+            creators,
+        )
+
+    print(f"Агрегаты обновлены: дней {len(rollup_keys.days)}, креаторов {len(rollup_keys.creators)}")
+
+
+async def get_high_water_mark(conn) -> Optional[datetime]:
+    """Возвращает максимальный updated_at уже загруженных видео или None."""
+    value = await conn.fetchval(
+        "SELECT value FROM load_state WHERE key = $1", HIGH_WATER_MARK_KEY
+    )
+    return datetime.fromisoformat(value) if value else None
+
+
+async def set_high_water_mark(conn, value: datetime):
+    """Сохраняет high-water mark инкрементальной синхронизации."""
+    await conn.execute(
+        """
+        INSERT INTO load_state (key, value, updated_at) VALUES ($1, $2, NOW())
+        ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW()
+        """,
+        HIGH_WATER_MARK_KEY,
+        value.isoformat(),
+    )
+
+
+class LoadStats:
+    """Счетчики загрузки и новый high-water mark."""
+
+    def __init__(self, high_water_mark: Optional[datetime]):
+        self.started = time.perf_counter()
+        self.processed_videos = 0
+        self.inserted_videos = 0
+        self.inserted_snapshots = 0
+        self.high_water_mark = high_water_mark
+        self.rollup_keys = RollupKeys()
+
+    def add_batch(self, video_records: list, videos_in_batch: int, counts: tuple = (0, 0)):
+        """Учитывает записанную (или пропущенную при продолжении) пачку."""
+        self.inserted_videos += counts[0]
+        self.inserted_snapshots += counts[1]
+        self.processed_videos += videos_in_batch
+
+        if video_records:
+            batch_max = max(record[VIDEO_UPDATED_AT] for record in video_records)
+            if self.high_water_mark is None or batch_max > self.high_water_mark:
+                self.high_water_mark = batch_max
+
+    def report(self):
+        """Печатает итоги загрузки."""
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        total_rows = self.inserted_videos + self.inserted_snapshots
+
+        print(f"\nЗагрузка завершена!")
+        print(f"Вставлено или обновлено видео: {self.inserted_videos}")
+        print(f"Вставлено снапшотов: {self.inserted_snapshots}")
+        print(f"Время загрузки: {elapsed:.1f} с ({total_rows / elapsed:.0f} строк/с)")
+
+
+def make_run_key(json_path: Path, batch_size: int, mode: str, high_water_mark: Optional[datetime]) -> str:
+    """
+    Вычисляет ключ запуска загрузки для таблицы load_progress.
+
+    Ключ совпадает только для того же файла с теми же параметрами, поэтому
+    номера пачек при повторном запуске соответствуют тем же данным.
+    """
+    stat = json_path.stat()
+    source = f"{json_path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}:{batch_size}:{mode}:{high_water_mark}"
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+
+def filter_changed(videos, high_water_mark: Optional[datetime]):
+    """Оставляет только видео, измененные после high-water mark."""
+    if high_water_mark is None:
+        return videos
+    return (
+        video for video in videos
+        if parse_timestamp(video["updated_at"]) > high_water_mark
+    )
+
+
+async def _load_serial(conn, partitions: SnapshotPartitions, json_path: Path, batch_size: int, mode: str):
+    """Загружает все данные по одному подключению в одной транзакции."""
+    await create_staging_tables(conn)
+
+    async with conn.transaction():
+        if mode == "full":
+            await conn.execute("TRUNCATE TABLE video_snapshots, videos CASCADE")
+            print("Все таблицы очищены")
+            high_water_mark = None
+            # После TRUNCATE транзакция и так держит video_snapshots до конца загрузки,
+            # а отдельное подключение не дождалось бы блокировки
+            partitions = SnapshotPartitions(conn)
+        else:
+            high_water_mark = await get_high_water_mark(conn)
+            if high_water_mark:
+                print(f"Инкрементальная загрузка изменений после {high_water_mark.isoformat()}")
+
+        stats = LoadStats(high_water_mark)
+        videos = filter_changed(iter_videos(json_path), high_water_mark)
+        rollup_keys = stats.rollup_keys if mode == "incremental" else None
+        for video_records, snapshot_records, videos_in_batch in iter_batches(videos, batch_size):
+            await partitions.ensure(snapshot_months(snapshot_records))
+            counts = await copy_batch(
+                conn, video_records, snapshot_records,
+                upsert=mode == "incremental", rollup_keys=rollup_keys,
+            )
+            stats.add_batch(video_records, videos_in_batch, counts)
+            print(f"Обработано видео: {stats.processed_videos}")
+
+        await refresh_rollups(conn, rollup_keys)
+        if stats.high_water_mark and stats.high_water_mark != high_water_mark:
+            await set_high_water_mark(conn, stats.high_water_mark)
+        await bump_data_version(conn)
+
+    return stats
+
+
+async def _load_parallel(
+    pool, partitions: SnapshotPartitions, json_path: Path, batch_size: int, mode: str, workers: int
+):
+    """
+    Загружает данные пачками параллельно по нескольким подключениям пула.
+
+    Пачки (шарды) нумеруются по порядку в файле и раздаются писателям через
+    ограниченную очередь. Каждая пачка содержит видео вместе со всеми их
+    снапшотами и пишется в своей транзакции (видео раньше снапшотов), а ее
+    номер фиксируется в load_progress в той же транзакции. При повторном
+    запуске с тем же файлом уже записанные пачки пропускаются.
+    """
+    async with pool.acquire() as conn:
+        high_water_mark = None if mode == "full" else await get_high_water_mark(conn)
+        run_key = make_run_key(json_path, batch_size, mode, high_water_mark)
+        done_batches = {
+            row["batch_no"]
+            for row in await conn.fetch(
+                "SELECT batch_no FROM load_progress WHERE run_key = $1", run_key
+            )
+        }
+
+        if done_batches:
+            print(f"Продолжение прерванной загрузки: уже записано пачек {len(done_batches)}")
+        elif mode == "full":
+            await conn.execute("TRUNCATE TABLE video_snapshots, videos CASCADE")
+            print("Все таблицы очищены")
+        elif high_water_mark:
+            print(f"Инкрементальная загрузка изменений после {high_water_mark.isoformat()}")
+
+    stats = LoadStats(high_water_mark)
+    # Ключи пачек, записанных до сбоя, неизвестны - при продолжении агрегаты пересобираются целиком
+    rollup_keys = stats.rollup_keys if mode == "incremental" and not done_batches else None
+    queue = asyncio.Queue(maxsize=workers * 2)
+    failures = []
+
+    async def writer():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            if failures:
+                # После ошибки только разбираем очередь, чтобы производитель не завис
+                continue
+
+            batch_no, video_records, snapshot_records, videos_in_batch = item
+            try:
+                await partitions.ensure(snapshot_months(snapshot_records))
+                async with pool.acquire() as conn:
+                    async with conn.transaction():
+                        counts = await copy_batch(
+                            conn, video_records, snapshot_records,
+                            upsert=mode == "incremental", rollup_keys=rollup_keys,
+                        )
+                        await conn.execute(
+                            """
+                            INSERT INTO load_progress (run_key, batch_no) VALUES ($1, $2)
+                            ON CONFLICT DO NOTHING
+                            """,
+                            run_key,
+                            batch_no,
+                        )
+            except Exception as e:
+                failures.append(e)
+                continue
+
+            stats.add_batch(video_records, videos_in_batch, counts)
+            print(f"Обработано видео: {stats.processed_videos} (пачка {batch_no})")
+
+    tasks = [asyncio.create_task(writer()) for _ in range(workers)]
+
+    try:
+        videos = filter_changed(iter_videos(json_path), high_water_mark)
+        for batch_no, (video_records, snapshot_records, videos_in_batch) in enumerate(
+            iter_batches(videos, batch_size)
+        ):
+            if failures:
+                break
+            if batch_no in done_batches:
+                stats.add_batch(video_records, videos_in_batch)
+                continue
+            await queue.put((batch_no, video_records, snapshot_records, videos_in_batch))
+
+        for _ in tasks:
+            await queue.put(None)
+        await asyncio.gather(*tasks)
     finally:
-        await conn.close()
+        # Если упал сам разбор файла (или загрузку отменили), писатели ждут очередь
+        # вечно: отменяем их, транзакции незаписанных пачек откатываются
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    if failures:
+        raise RuntimeError(
+            f"Загрузка прервана: {failures[0]}. "
+            f"Повторный запуск продолжит с незаписанных пачек."
+        ) from failures[0]
+
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await refresh_rollups(conn, rollup_keys)
+            if stats.high_water_mark and stats.high_water_mark != high_water_mark:
+                await set_high_water_mark(conn, stats.high_water_mark)
+            await conn.execute("DELETE FROM load_progress WHERE run_key = $1", run_key)
+            await bump_data_version(conn)
+
+    return stats
+
+
+async def load_json_to_db(
+    json_path=None,
+    batch_size: int = None,
+    mode: str = None,
+    workers: int = None,
+):
+    """
+    Загружает данные из videos.json в PostgreSQL.
+
+    Файл разбирается потоково (iter_videos), а данные копируются пачками
+    через COPY (copy_records_to_table), что заменяет сотни тысяч отдельных
+    INSERT несколькими обращениями к серверу. В памяти одновременно
+    находится не больше нескольких пачек.
+
+    В режиме incremental таблицы не очищаются: загружаются только видео,
+    у которых updated_at больше сохраненного high-water mark, а из их
+    снапшотов добавляются только новые.
 
+    При workers == 1 вся загрузка идет в одной транзакции: в режиме
+    incremental бот до ее окончания отвечает по прежним данным. При
+    workers > 1 пачки пишутся параллельно по пулу подключений, каждая в своей
+    транзакции, а после сбоя повторный запуск продолжает с незаписанных пачек.
 
-async def load_json_to_db():
-    """Загружает данные из videos.json в PostgreSQL."""
+    Режим full - это простой бота: при workers == 1 TRUNCATE держит
+    ACCESS EXCLUSIVE на videos и video_snapshots до конца загрузки, и
+    запросы к ним ждут ее (или останавливаются по statement_timeout), а при
+    workers > 1 таблицы очищаются сразу, и до конца загрузки бот видит
+    неполные данные.
+
+    Args:
+        json_path: Путь к JSON-файлу (по умолчанию app/videos.json)
+        batch_size: Сколько снапшотов копировать за один раз
+        mode: "incremental" (по умолчанию) или "full" - очистить таблицы и загрузить все заново
+        workers: Количество параллельных подключений (по умолчанию LOAD_WORKERS)
+    """
     database_url = os.getenv("DATABASE_URL")
     if not database_url:
         raise ValueError("DATABASE_URL не установлен в переменных окружения")
 
     params = parse_database_url(database_url)
-    
+    json_path = Path(json_path) if json_path else Path(__file__).parent / "app" / "videos.json"
+    batch_size = batch_size or LOAD_BATCH_SIZE
+    workers = max(1, workers or LOAD_WORKERS)
+    mode = mode or LOAD_MODE
+    if mode not in ("incremental", "full"):
+        raise ValueError(f"Неизвестный режим загрузки: {mode}")
+    if mode == "full":
+        print(
+            "Внимание: полная загрузка очищает таблицы, до ее окончания запросы к данным "
+            "будут ждать или получат неполные данные"
+        )
+
+    print(f"Загрузка данных из {json_path}...")
+
+    if not json_path.exists():
+        raise FileNotFoundError(f"Файл {json_path} не найден")
+
     print(f"Подключение к базе данных {params['database']}...")
-    
-    conn = await asyncpg.connect(
+
+    connect_params = dict(
         user=params["user"],
         password=params["password"],
         database=params["database"],
@@ -81,92 +928,35 @@ async def load_json_to_db():
         port=params["port"],
     )
 
+    # Секции создаются на своем подключении, вне транзакций загрузки
+    partitions_conn = await asyncpg.connect(**connect_params)
+    partitions = SnapshotPartitions(partitions_conn)
     try:
-        json_path = Path(__file__).parent / "app" / "videos.json"
-        print(f"Загрузка данных из {json_path}...")
-
-        if not json_path.exists():
-            raise FileNotFoundError(f"Файл {json_path} не найден")
-
-        with open(json_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        videos = data.get("videos", [])
-        print(f"Найдено видео: {len(videos)}")
-
-        await conn.execute("TRUNCATE TABLE video_snapshots CASCADE")
-        await conn.execute("TRUNCATE TABLE videos CASCADE")
-        print("Все таблицы очищены")
-
-        inserted_videos = 0
-        inserted_snapshots = 0
-
-        async with conn.transaction():
-            for video in videos:
-                video_created_at = datetime.fromisoformat(video["video_created_at"].replace("Z", "+00:00"))
-                created_at = datetime.fromisoformat(video["created_at"].replace("Z", "+00:00"))
-                updated_at = datetime.fromisoformat(video["updated_at"].replace("Z", "+00:00"))
-
-                await conn.execute(
-                    """
-                    INSERT INTO videos (
-                        id, creator_id, video_created_at, views_count,
-                        likes_count, comments_count, reports_count,
-                        created_at, updated_at
-                    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-                    ON CONFLICT (id) DO NOTHING
-                    """,
-                    video["id"],
-                    video["creator_id"],
-                    video_created_at,
-                    video["views_count"],
-                    video["likes_count"],
-                    video["comments_count"],
-                    video["reports_count"],
-                    created_at,
-                    updated_at,
-                )
-                inserted_videos += 1
-
-                for snapshot in video.get("snapshots", []):
-                    snapshot_created_at = datetime.fromisoformat(snapshot["created_at"].replace("Z", "+00:00"))
-                    snapshot_updated_at = datetime.fromisoformat(snapshot["updated_at"].replace("Z", "+00:00"))
-
-                    await conn.execute(
-                        """
-                        INSERT INTO video_snapshots (
-                            id, video_id, views_count, likes_count,
-                            comments_count, reports_count,
-                            delta_views_count, delta_likes_count,
-                            delta_comments_count, delta_reports_count,
-                            created_at, updated_at
-                        ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
-                        ON CONFLICT (id) DO NOTHING
-                        """,
-                        snapshot["id"],
-                        snapshot["video_id"],
-                        snapshot["views_count"],
-                        snapshot["likes_count"],
-                        snapshot["comments_count"],
-                        snapshot["reports_count"],
-                        snapshot["delta_views_count"],
-                        snapshot["delta_likes_count"],
-                        snapshot["delta_comments_count"],
-                        snapshot["delta_reports_count"],
-                        snapshot_created_at,
-                        snapshot_updated_at,
-                    )
-                    inserted_snapshots += 1
-
-                if inserted_videos % 100 == 0:
-                    print(f"Обработано видео: {inserted_videos}")
-
-        print(f"\nЗагрузка завершена!")
-        print(f"Вставлено видео: {inserted_videos}")
-        print(f"Вставлено снапшотов: {inserted_snapshots}")
-
+        if workers == 1:
+            conn = await asyncpg.connect(**connect_params)
+            try:
+                stats = await _load_serial(conn, partitions, json_path, batch_size, mode)
+                await apply_retention(conn)
+            finally:
+                await conn.close()
+        else:
+            print(f"Параллельная загрузка: {workers} подключений")
+            pool = await asyncpg.create_pool(
+                **connect_params,
+                min_size=workers,
+                max_size=workers,
+                init=create_staging_tables,
+            )
+            try:
+                stats = await _load_parallel(pool, partitions, json_path, batch_size, mode, workers)
+                async with pool.acquire() as conn:
+                    await apply_retention(conn)
+            finally:
+                await pool.close()
     finally:
-        await conn.close()
+        await partitions_conn.close()
+
+    stats.report()
 
 
 async def main():
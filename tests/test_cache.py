@@ -0,0 +1,28 @@
+from bot.cache import LRUCache, normalize_question
+
+
+def test_normalize_question_ignores_case_punctuation_and_spaces():
+    assert normalize_question("  Сколько ВСЕГО видео,   есть?! ") == "сколько всего видео есть"
+    assert normalize_question("Ещё") == normalize_question("еще")
+
+
+def test_normalize_question_keeps_identifier_case():
+    first = normalize_question("Сколько видео у креатора с id AbC вышло с 1 по 5 ноября 2025?")
+    second = normalize_question("Сколько видео у креатора с id abc вышло с 1 по 5 ноября 2025?")
+    assert "AbC" in first
+    assert first != second
+
+
+def test_normalize_question_keeps_hyphens_and_underscores():
+    assert normalize_question("креатор creator_7-a!") == "креатор creator_7-a"
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
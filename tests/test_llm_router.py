@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from bot import llm_router
+from bot.llm_router import LLMBackend, LLMBackendError, LLMRouter, _is_permanent
+
+
+class FakeBackend(LLMBackend):
+    """Модель, отвечающая text через delay секунд (или ошибкой error)."""
+
+    active = 0
+    max_active = 0
+
+    def __init__(self, model: str, delay: float = 0, text: str = "SELECT 1", error: Exception = None):
+        super().__init__("fake", model, client=None, system_prompt="")
+        self.delay = delay
+        self.text = text
+        self.error = error
+        self.calls = 0
+
+    async def request(self, user_prompt: str, timeout: float) -> str:
+        self.calls += 1
+        FakeBackend.active += 1
+        FakeBackend.max_active = max(FakeBackend.max_active, FakeBackend.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.error is not None:
+                raise self.error
+            return self.text
+        finally:
+            FakeBackend.active -= 1
+
+
+@pytest.fixture(autouse=True)
+def fast_hedge(monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_DELAY", 0.05)
+    FakeBackend.active = FakeBackend.max_active = 0
+
+
+def test_slow_model_is_hedged_to_the_next_one():
+    slow = FakeBackend("slow", delay=1, text="slow")
+    fast = FakeBackend("fast", delay=0, text="fast")
+    router = LLMRouter([slow, fast])
+    # Модели без замеров пробуются первыми: даем быстрой историю, чтобы первой пошла медленная
+    fast.latencies.append(0.5)
+
+    text, backend = asyncio.run(router.request("q", timeout=5))
+    assert (text, backend) == ("fast", fast)
+    assert router.hedged == 1
+    # Проигравший запрос отменен, но его время учтено
+    assert len(slow.latencies) == 1
+
+
+def test_failed_model_is_replaced_and_paused():
+    broken = FakeBackend("broken", error=RuntimeError("503 unavailable"))
+    working = FakeBackend("working", text="ok")
+    working.latencies.append(0.5)
+    router = LLMRouter([broken, working], hedge=False)
+
+    assert asyncio.run(router.request("q", timeout=5)) == ("ok", working)
+    assert broken.consecutive_errors == 1
+    assert router.ranked()[0] is working
+
+
+def test_all_models_failing_raise_the_last_error():
+    router = LLMRouter([FakeBackend("a", error=RuntimeError("a")), FakeBackend("b", error=RuntimeError("b"))])
+    with pytest.raises(LLMBackendError):
+        asyncio.run(router.request("q", timeout=5))
+
+
+def test_timeout():
+    router = LLMRouter([FakeBackend("slow", delay=1)], hedge=False)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(router.request("q", timeout=0.05))
+
+
+def test_semaphore_bounds_hedged_requests():
+    async def scenario():
+        backends = [FakeBackend(f"m{i}", delay=0.2) for i in range(3)]
+        router = LLMRouter(backends, semaphore=asyncio.Semaphore(2))
+        await asyncio.gather(*(router.request("q", timeout=5) for _ in range(4)))
+
+    asyncio.run(scenario())
+    assert FakeBackend.max_active == 2
+
+
+def test_permanent_errors():
+    class BadRequest(Exception):
+        status_code = 400
+
+    assert _is_permanent(BadRequest("bad request"))
+    assert _is_permanent(RuntimeError("400 Developer instruction is not enabled for models/gemini-pro"))
+    assert _is_permanent(RuntimeError("403 Forbidden"))
+    assert not _is_permanent(RuntimeError("429 quota exceeded"))
+    assert not _is_permanent(asyncio.TimeoutError())
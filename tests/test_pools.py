@@ -0,0 +1,80 @@
+import asyncio
+
+from bot import pools
+from bot.pools import PoolManager, Replica
+
+
+class FakePrimary:
+    def __init__(self, lsns):
+        self.lsns = list(lsns)
+
+    async def fetchval(self, query, timeout=None):
+        await asyncio.sleep(0)
+        value = self.lsns.pop(0)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+class FakeReplicaPool:
+    """Реплика, применившая WAL до replay_lsn (позиции сравниваются как числа)."""
+
+    def __init__(self, replay_lsn):
+        self.replay_lsn = replay_lsn
+
+    async def fetchrow(self, query, min_lsn, timeout=None):
+        return {"lag": 0, "caught_up": min_lsn is None or self.replay_lsn >= int(min_lsn)}
+
+    def get_size(self):
+        return 1
+
+    def get_idle_size(self):
+        return 1
+
+    def get_max_size(self):
+        return 1
+
+
+def make_manager(primary, replay_lsn) -> PoolManager:
+    manager = PoolManager()
+    manager.primary = primary
+    manager.primary_read = "primary_read"
+    manager.replicas = [Replica("replica", FakeReplicaPool(replay_lsn))]
+    return manager
+
+
+def test_replicas_stay_excluded_until_lsn_is_read(monkeypatch):
+    monkeypatch.setattr(pools, "DB_REPLICA_CHECK_INTERVAL", 0)
+
+    async def scenario():
+        manager = make_manager(FakePrimary([OSError("down"), "20"]), replay_lsn=10)
+        manager.require_fresh_reads()
+        # Проверка по расписанию до того, как позиция прочитана, не возвращает реплику
+        await manager.check_replicas()
+        assert manager.read_pool() == "primary_read"
+
+        await manager._lsn_task
+        assert manager._min_lsn == "20"
+        assert manager.read_pool() == "primary_read"
+
+        manager.replicas[0].pool.replay_lsn = 20
+        await manager.check_replicas()
+        assert manager.read_pool() is manager.replicas[0].pool
+
+    asyncio.run(scenario())
+
+
+def test_lsn_is_reread_after_a_newer_change():
+    async def scenario():
+        primary = FakePrimary(["10", "30"])
+        manager = make_manager(primary, replay_lsn=10)
+        manager.require_fresh_reads()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        # Второе изменение пришло, пока читалась позиция первого
+        manager.require_fresh_reads()
+        await manager._lsn_task
+        assert manager._min_lsn == "30"
+        assert manager.read_pool() == "primary_read"
+
+    asyncio.run(scenario())
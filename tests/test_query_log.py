@@ -0,0 +1,46 @@
+import asyncio
+
+from bot.query_log import QueryLog
+
+
+class NoDatabase:
+    """База, к которой нельзя подключиться: фоновые EXPLAIN тихо завершаются ошибкой."""
+
+    pool = None
+
+    class pools:
+        @staticmethod
+        def read_pool():
+            raise ConnectionError("no database")
+
+
+def test_shape_memory_is_bounded():
+    async def scenario():
+        log = QueryLog(NoDatabase(), slow_ms=0, max_shapes=10)
+        log.start()
+        for i in range(100):
+            log.record(f"SELECT {i}", (), f"SELECT {i}", 0.5)
+        await log.stop()
+        return log
+
+    log = asyncio.run(scenario())
+    assert len(log._estimated) == 10
+    assert len(log._last_explain) == 10
+    assert len(log._pending) == 100
+
+
+def test_slow_query_is_explained_once_per_interval():
+    async def scenario():
+        log = QueryLog(NoDatabase(), slow_ms=100)
+        log.start()
+        spawned = []
+        log._spawn = lambda coro: (spawned.append(coro.__qualname__), coro.close())
+        log.record("SELECT 1", (), "SELECT $1", 0.5)
+        log.record("SELECT 2", (), "SELECT $1", 0.5)
+        log.record("SELECT 3", (), "SELECT $1", 0.01, error="timeout")
+        return spawned, log._pending
+
+    spawned, pending = asyncio.run(scenario())
+    assert spawned == ["QueryLog._estimate", "QueryLog._explain_analyze"]
+    entry = next(iter(pending.values()))
+    assert (entry["calls"], entry["slow"], entry["failed"], entry["error"]) == (3, 2, 1, "timeout")
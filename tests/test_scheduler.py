@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from bot.scheduler import QueryScheduler, SchedulerBusy, SingleFlight
+
+
+def test_slots_are_shared_between_chats_in_turn():
+    async def scenario():
+        scheduler = QueryScheduler(max_in_flight=1, max_queue_per_chat=5)
+        release = asyncio.Event()
+        order = []
+
+        def job(name):
+            async def run():
+                order.append(name)
+                await release.wait()
+                return name
+            return run
+
+        waiters = [asyncio.ensure_future(scheduler.submit("busy", "first", job("busy-1")))]
+        await asyncio.sleep(0)
+        waiters += [
+            asyncio.ensure_future(scheduler.submit("busy", f"q{i}", job(f"busy-{i}"))) for i in (2, 3)
+        ]
+        waiters.append(asyncio.ensure_future(scheduler.submit("quiet", "q", job("quiet-1"))))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*waiters)
+        return order
+
+    # Второй чат не ждет, пока первый разберет всю свою очередь
+    assert asyncio.run(scenario()) == ["busy-1", "busy-2", "quiet-1", "busy-3"]
+
+
+def test_repeated_question_of_a_chat_is_coalesced():
+    async def scenario():
+        scheduler = QueryScheduler()
+        calls = []
+
+        async def run():
+            calls.append(1)
+            await asyncio.sleep(0)
+            return 42
+
+        results = await asyncio.gather(*(scheduler.submit("chat", "same", run) for _ in range(3)))
+        return results, len(calls), scheduler.stats()["coalesced"]
+
+    assert asyncio.run(scenario()) == ([42, 42, 42], 1, 2)
+
+
+def test_full_queue_is_rejected():
+    async def scenario():
+        scheduler = QueryScheduler(max_in_flight=1, max_queue_per_chat=1)
+        release = asyncio.Event()
+
+        async def run():
+            await release.wait()
+
+        running = asyncio.ensure_future(scheduler.submit("chat", "a", run))
+        await asyncio.sleep(0)
+        queued = asyncio.ensure_future(scheduler.submit("chat", "b", run))
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerBusy):
+            await scheduler.submit("chat", "c", run)
+        release.set()
+        await asyncio.gather(running, queued)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_job_does_not_leave_waiters_hanging():
+    async def scenario():
+        scheduler = QueryScheduler()
+        started = asyncio.Event()
+
+        async def run():
+            started.set()
+            await asyncio.Event().wait()
+
+        first = asyncio.ensure_future(scheduler.submit("chat", "q", run))
+        second = asyncio.ensure_future(scheduler.submit("chat", "q", run))
+        await started.wait()
+        for task in asyncio.all_tasks():
+            if task.get_coro().__qualname__ == "QueryScheduler._run":
+                task.cancel()
+        results = await asyncio.wait_for(asyncio.gather(first, second, return_exceptions=True), 1)
+        return results, scheduler.stats()["in_flight"]
+
+    results, in_flight = asyncio.run(scenario())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert in_flight == 0
+
+
+def test_single_flight_shares_one_call():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def run():
+            calls.append(1)
+            await asyncio.sleep(0)
+            return "sql"
+
+        results = await asyncio.gather(*(flight.do("key", run) for _ in range(3)))
+        # После завершения следующий вызов считается заново
+        await flight.do("key", run)
+        return results, len(calls), flight.stats()
+
+    assert asyncio.run(scenario()) == (["sql"] * 3, 2, {"in_flight": 0, "shared": 2})
+
+
+def test_single_flight_survives_cancelled_waiter():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def run():
+            await release.wait()
+            return 7
+
+        leader = asyncio.ensure_future(flight.do("key", run))
+        follower = asyncio.ensure_future(flight.do("key", run))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return await follower
+
+    assert asyncio.run(scenario()) == 7
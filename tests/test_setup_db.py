@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from setup_db import iter_batches, iter_videos
+
+
+def snapshot(video_id: str, index: int) -> dict:
+    return {
+        "id": f"{video_id}-{index}",
+        "video_id": video_id,
+        "views_count": index,
+        "likes_count": 0,
+        "comments_count": 0,
+        "reports_count": 0,
+        "delta_views_count": 1,
+        "delta_likes_count": 0,
+        "delta_comments_count": 0,
+        "delta_reports_count": 0,
+        "created_at": "2025-11-01T10:00:00+00:00",
+        "updated_at": "2025-11-01T10:00:00+00:00",
+    }
+
+
+def video(video_id: str, snapshots: int) -> dict:
+    return {
+        "id": video_id,
+        # Скобки и запятые внутри строк не должны сбивать разбор
+        "creator_id": f"creator ], {{ {video_id}",
+        "video_created_at": "2025-11-01T09:00:00+00:00",
+        "views_count": 10,
+        "likes_count": 1,
+        "comments_count": 0,
+        "reports_count": 0,
+        "created_at": "2025-11-01T09:00:00+00:00",
+        "updated_at": "2025-11-01T09:00:00+00:00",
+        "snapshots": [snapshot(video_id, index) for index in range(snapshots)],
+    }
+
+
+VIDEOS = [video(f"v{index}", snapshots=index % 3) for index in range(5)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_iter_videos_across_chunk_boundaries(tmp_path, chunk_size):
+    path = tmp_path / "videos.json"
+    # Перед массивом - длинный текст, чтобы ключ "videos" оказался на границе блоков
+    path.write_text(json.dumps({"comment": "x" * 100, "videos": VIDEOS}, indent=2), encoding="utf-8")
+
+    assert list(iter_videos(path, chunk_size=chunk_size)) == VIDEOS
+
+
+def test_iter_videos_empty_and_missing_array(tmp_path):
+    empty = tmp_path / "empty.json"
+    empty.write_text('{"videos": [ ]}', encoding="utf-8")
+    missing = tmp_path / "missing.json"
+    missing.write_text('{"other": []}', encoding="utf-8")
+
+    assert list(iter_videos(empty, chunk_size=4)) == []
+    assert list(iter_videos(missing, chunk_size=4)) == []
+
+
+def test_iter_videos_truncated_file(tmp_path):
+    path = tmp_path / "truncated.json"
+    path.write_text(json.dumps({"videos": VIDEOS})[:-40], encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        list(iter_videos(path, chunk_size=16))
+
+
+def test_iter_batches_keep_videos_whole():
+    batches = list(iter_batches(VIDEOS, batch_size=2))
+
+    assert [count for _, _, count in batches] == [2, 1, 2]
+    assert sum(len(snapshots) for _, snapshots, _ in batches) == sum(len(v["snapshots"]) for v in VIDEOS)
+    for videos, snapshots, _ in batches:
+        video_ids = {record[0] for record in videos}
+        assert all(record[1] in video_ids for record in snapshots)
@@ -0,0 +1,83 @@
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from bot.sql_normalizer import normalize_sql, parameterize
+
+
+def test_parameterize_strings_dates_and_numbers():
+    query, params = parameterize(
+        "SELECT COUNT(*) FROM videos WHERE creator_id = 'abc' "
+        "AND video_created_at >= '2025-11-01' AND views_count > 100000 AND likes_count > 1.5"
+    )
+    assert query == (
+        "SELECT COUNT(*) FROM videos WHERE creator_id = $1::text "
+        "AND video_created_at >= $2::date AND views_count > $3::int AND likes_count > $4::numeric"
+    )
+    assert params == ["abc", date(2025, 11, 1), 100000, Decimal("1.5")]
+
+
+def test_parameterize_timestamps_and_big_numbers():
+    query, params = parameterize(
+        "SELECT COUNT(*) FROM video_snapshots "
+        "WHERE created_at >= '2025-11-28 10:00+03' AND created_at < '2025-11-28T12:00' AND views_count < 3000000000"
+    )
+    assert query == (
+        "SELECT COUNT(*) FROM video_snapshots "
+        "WHERE created_at >= $1::timestamptz AND created_at < $2::timestamp AND views_count < $3::bigint"
+    )
+    assert params[0].utcoffset().total_seconds() == 3 * 3600
+    assert params[1:] == [datetime(2025, 11, 28, 12, 0), 3000000000]
+
+    _, params = parameterize("SELECT COUNT(*) FROM videos WHERE video_created_at >= '2025-11-28T00:00:00Z'")
+    assert params == [datetime(2025, 11, 28, tzinfo=timezone.utc)]
+
+
+def test_parameterize_reuses_placeholder_for_equal_literals():
+    query, params = parameterize(
+        "SELECT DATE_TRUNC('day', created_at), COUNT(*) FROM video_snapshots "
+        "GROUP BY DATE_TRUNC('day', created_at)"
+    )
+    assert query == (
+        "SELECT DATE_TRUNC($1::text, created_at), COUNT(*) FROM video_snapshots "
+        "GROUP BY DATE_TRUNC($1::text, created_at)"
+    )
+    assert params == ["day"]
+
+
+def test_parameterize_keeps_equal_values_of_different_types_apart():
+    query, params = parameterize("SELECT COUNT(*) FROM videos WHERE creator_id = '5' AND views_count > 5 AND likes_count > 5")
+    assert query == (
+        "SELECT COUNT(*) FROM videos WHERE creator_id = $1::text AND views_count > $2::int AND likes_count > $2::int"
+    )
+    assert params == ["5", 5]
+
+
+def test_parameterize_leaves_syntax_literals():
+    query, params = parameterize(
+        "SELECT COUNT(*) FROM video_snapshots WHERE created_at >= DATE '2025-11-01' "
+        "AND created_at < NOW() - INTERVAL '1 day' GROUP BY 1 ORDER BY 1, 2 LIMIT 5"
+    )
+    assert "DATE '2025-11-01'" in query and "INTERVAL '1 day'" in query
+    assert "GROUP BY 1 ORDER BY 1, 2 LIMIT $1::int" in query
+    assert params == [5]
+
+
+def test_parameterize_skips_comments_and_collapses_whitespace():
+    query, params = parameterize("SELECT  COUNT(*)\n  FROM videos -- 'comment'\n WHERE id = 'x'; ")
+    assert query == "SELECT COUNT(*) FROM videos WHERE id = $1::text"
+    assert params == ["x"]
+
+    _, params = parameterize("SELECT 'it''s'")
+    assert params == ["it's"]
+
+
+def test_parameterize_refuses_unsafe_queries():
+    assert parameterize("SELECT COUNT(*) FROM videos WHERE views_count > $1") is None
+    assert parameterize("SELECT $$text$$") is None
+    assert parameterize("SELECT 'unterminated") is None
+    assert parameterize("SELECT 1 /* unterminated") is None
+
+
+def test_normalize_sql():
+    assert normalize_sql("  SELECT\n COUNT(*)   FROM videos ; ") == "SELECT COUNT(*) FROM videos"
+
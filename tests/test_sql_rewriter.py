@@ -0,0 +1,71 @@
+from datetime import date
+
+from bot.sql_rewriter import rewrite_query
+from bot.templates import day_start
+
+
+def bound(year: int, month: int, day: int) -> str:
+    return f"'{day_start(date(year, month, day)).isoformat()}'"
+
+
+def test_day_equality():
+    assert rewrite_query("SELECT COUNT(*) FROM videos WHERE DATE(video_created_at) = '2025-11-28'") == (
+        "SELECT COUNT(*) FROM videos WHERE "
+        f"(video_created_at >= {bound(2025, 11, 28)} AND video_created_at < {bound(2025, 11, 29)})"
+    )
+
+
+def test_day_comparisons():
+    assert rewrite_query("WHERE created_at::date >= DATE '2025-11-01'") == f"WHERE created_at >= {bound(2025, 11, 1)}"
+    assert rewrite_query("WHERE DATE(s.created_at) > '2025-11-01'") == f"WHERE s.created_at >= {bound(2025, 11, 2)}"
+    assert rewrite_query("WHERE DATE(created_at) <= '2025-11-05'") == f"WHERE created_at < {bound(2025, 11, 6)}"
+    assert rewrite_query("WHERE DATE(created_at) < '2025-11-05'") == f"WHERE created_at < {bound(2025, 11, 5)}"
+
+
+def test_day_between():
+    assert rewrite_query("WHERE DATE_TRUNC('day', created_at) BETWEEN '2025-11-01' AND '2025-11-05'") == (
+        f"WHERE (created_at >= {bound(2025, 11, 1)} AND created_at < {bound(2025, 11, 6)})"
+    )
+
+
+def test_column_between_includes_last_day():
+    assert rewrite_query(
+        "WHERE video_created_at BETWEEN DATE('2025-11-01') AND DATE('2025-11-05') AND views_count > 10"
+    ) == (
+        f"WHERE (video_created_at >= {bound(2025, 11, 1)} AND video_created_at < {bound(2025, 11, 6)})"
+        " AND views_count > 10"
+    )
+    assert rewrite_query("WHERE created_at BETWEEN DATE '2025-11-01' AND '2025-11-05'::date") == (
+        f"WHERE (created_at >= {bound(2025, 11, 1)} AND created_at < {bound(2025, 11, 6)})"
+    )
+
+
+def test_plain_column_between_is_kept():
+    query = "WHERE created_at BETWEEN '2025-11-01' AND '2025-11-05'"
+    assert rewrite_query(query) == query
+    query = "WHERE created_at BETWEEN DATE('2025-11-01') AND '2025-11-05'"
+    assert rewrite_query(query) == query
+
+
+def test_not_between():
+    assert rewrite_query("WHERE video_created_at NOT BETWEEN DATE('2025-11-01') AND DATE('2025-11-05')") == (
+        f"WHERE (video_created_at < {bound(2025, 11, 1)} OR video_created_at >= {bound(2025, 11, 6)})"
+    )
+    assert rewrite_query("WHERE DATE(created_at) not between '2025-11-01' and '2025-11-05'") == (
+        f"WHERE (created_at < {bound(2025, 11, 1)} OR created_at >= {bound(2025, 11, 6)})"
+    )
+
+
+def test_keywords_are_not_columns():
+    query = "WHERE likes_count > 0 AND NOT BETWEEN_FLAG"
+    assert rewrite_query(query) == query
+    assert "(NOT" not in rewrite_query("WHERE x = 1 OR created_at NOT BETWEEN DATE '2025-11-01' AND DATE '2025-11-02'")
+
+
+def test_untouched_queries():
+    for query in (
+        "SELECT COUNT(*) FROM videos",
+        "SELECT COUNT(*) FROM videos WHERE views_count BETWEEN 10 AND 20",
+        "SELECT COUNT(*) FROM videos WHERE DATE(video_created_at) = '2025-02-30'",
+    ):
+        assert rewrite_query(query) == query
@@ -0,0 +1,111 @@
+from datetime import date, datetime
+
+from bot.templates import REPORT_TIMEZONE, match_template, parse_date_range, template_statements
+
+CREATOR_QUESTION = "Сколько видео у креатора с id {creator} вышло с 1 ноября 2025 по 5 ноября 2025{tail}"
+
+
+def day(*args) -> datetime:
+    return datetime(*args, tzinfo=REPORT_TIMEZONE)
+
+
+def test_parse_date_range_full_dates():
+    assert parse_date_range("с 1 ноября 2025 по 5 ноября 2025") == (date(2025, 11, 1), date(2025, 11, 5))
+
+
+def test_parse_date_range_takes_month_and_year_from_end():
+    assert parse_date_range("вышло с 28 октября по 3 ноября 2025") == (date(2025, 10, 28), date(2025, 11, 3))
+    assert parse_date_range("с 1 по 5 ноября 2025") == (date(2025, 11, 1), date(2025, 11, 5))
+
+
+def test_parse_date_range_rejects_invalid_ranges():
+    assert parse_date_range("с 1 по 5 ноября") is None
+    assert parse_date_range("с 10 по 5 ноября 2025") is None
+    assert parse_date_range("с 1 по 31 ноября 2025") is None
+    assert parse_date_range("сколько всего видео") is None
+
+
+def test_parse_date_range_whole():
+    assert parse_date_range("с 1 по 5 ноября 2025 включительно", whole=True) == (date(2025, 11, 1), date(2025, 11, 5))
+    assert parse_date_range("с 1 по 5 ноября 2025 и набрало 10 лайков", whole=True) is None
+
+
+def test_total():
+    assert match_template("Сколько всего видео есть в системе?") == ("SELECT COUNT(*) FROM videos", [])
+
+
+def test_creator_range():
+    sql, params = match_template(CREATOR_QUESTION.format(creator="creator7", tail=" включительно?"))
+    assert "creator_id = $1" in sql
+    assert params == ["creator7", day(2025, 11, 1), day(2025, 11, 6)]
+
+
+def test_creator_range_with_rollups():
+    sql, params = match_template(CREATOR_QUESTION.format(creator="creator7", tail="?"), use_rollups=True)
+    assert "creator_daily_videos" in sql
+    assert params == ["creator7", date(2025, 11, 1), date(2025, 11, 5)]
+
+
+def test_creator_id_keeps_original_case():
+    _, params = match_template(CREATOR_QUESTION.format(creator="AbC123", tail=""))
+    assert params[0] == "AbC123"
+    _, params = match_template(CREATOR_QUESTION.format(creator="Вася", tail=""))
+    assert params[0] == "Вася"
+
+
+def test_creator_with_extra_conditions_is_not_a_template():
+    assert match_template(CREATOR_QUESTION.format(creator="creator7", tail=" и набрало больше 1000 просмотров")) is None
+    assert match_template(CREATOR_QUESTION.format(creator="creator7", tail=", не считая видео с жалобами")) is None
+
+
+def test_threshold():
+    assert match_template("Сколько видео набрало больше 100 000 просмотров за все время?") == (
+        "SELECT COUNT(*) FROM videos WHERE views_count > $1::bigint",
+        [100000],
+    )
+    assert match_template("Сколько видео получили меньше 5 жалоб")[0].endswith("reports_count < $1::bigint")
+
+
+def test_threshold_beyond_integer_range():
+    sql, params = match_template("Сколько видео набрало больше 3000000000 просмотров")
+    assert sql.endswith("views_count > $1::bigint")
+    assert params == [3000000000]
+    assert match_template("Сколько видео набрало больше 100000000000000000000 лайков")[1] == [2 ** 63 - 1]
+
+
+def test_delta_sum():
+    sql, params = match_template("На сколько просмотров в сумме выросли все видео 28 ноября 2025?")
+    assert "SUM(delta_views_count)" in sql and "video_snapshots" in sql
+    assert params == [day(2025, 11, 28), day(2025, 11, 29)]
+
+    sql, params = match_template("На сколько лайков выросли все видео 28 ноября 2025", use_rollups=True)
+    assert "daily_snapshot_stats" in sql
+    assert params == [date(2025, 11, 28)]
+
+
+def test_distinct():
+    sql, params = match_template("Сколько разных видео получали новые лайки 12 ноября 2025?")
+    assert "COUNT(DISTINCT video_id)" in sql and "delta_likes_count > 0" in sql
+    assert params == [day(2025, 11, 12), day(2025, 11, 13)]
+
+    sql, _ = match_template("Сколько разных видео получали новые лайки 12 ноября 2025?", use_rollups=True)
+    assert "videos_with_new_likes" in sql
+
+
+def test_unknown_question():
+    assert match_template("Какой креатор самый популярный?") is None
+
+
+def test_template_statements_cover_all_templates():
+    statements = {sql for sql, _ in template_statements()}
+    questions = [
+        "Сколько всего видео?",
+        CREATOR_QUESTION.format(creator="creator7", tail=""),
+        "Сколько видео набрало больше 10 комментариев",
+        "Сколько видео получили меньше 10 лайков",
+        "На сколько жалоб выросли все видео 1 ноября 2025",
+        "Сколько разных видео получали новые комментарии 1 ноября 2025",
+    ]
+    for question in questions:
+        for use_rollups in (False, True):
+            assert match_template(question, use_rollups)[0] in statements